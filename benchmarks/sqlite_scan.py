@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark SQLite table scans with default connection settings against the
+bulk-read profile used for migration reads.
+
+    python benchmarks/sqlite_scan.py --rows 100000 --repeat 3
+
+A synthetic `chat` table is written to a temporary database, then read in
+full and sorted by a column without an index, as `stream_sqlite_rows()` does.
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from open_webui_sqlite_migration.migrate import (
+    TableFilter,
+    open_sqlite_snapshot,
+    sqlite_schema,
+    stream_sqlite_rows,
+)
+
+WORDS = (
+    "the model answer question code python error table query index page cache "
+    "memory file stream chat message user assistant system prompt token"
+).split()
+
+PROFILES = {
+    "default": lambda path: sqlite3.connect(path, timeout=60),
+    "bulk-read": open_sqlite_snapshot,
+}
+
+SCANS = {
+    "full": TableFilter(),
+    "sorted": TableFilter(order_by="updated_at"),
+}
+
+
+def generate(path: Path, rows: int, seed: int = 0) -> None:
+    """Write a `chat` table shaped like Open WebUI's: ids, timestamps and JSON histories."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE chat (
+            id VARCHAR(255) PRIMARY KEY,
+            user_id VARCHAR(255),
+            title TEXT,
+            chat JSON,
+            created_at BIGINT,
+            updated_at BIGINT,
+            meta JSON
+        )
+    """)
+
+    def row(i):
+        messages = [
+            {
+                "role": "user" if m % 2 == 0 else "assistant",
+                "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 80))),
+            }
+            for m in range(rng.randint(1, 8))
+        ]
+        created = 1_700_000_000 + rng.randrange(10_000_000)
+        return (
+            f"{i:08d}-{rng.getrandbits(64):016x}",
+            f"user-{rng.randrange(500)}",
+            f"Chat {i}",
+            json.dumps({"messages": messages}),
+            created,
+            created + rng.randrange(1_000_000),
+            json.dumps({"tags": rng.sample(WORDS, 2)}),
+        )
+
+    conn.executemany(
+        "INSERT INTO chat VALUES (?, ?, ?, ?, ?, ?, ?)", (row(i) for i in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+def scan(path: Path, profile: str, table_filter: TableFilter):
+    """Read the whole table on a new connection; returns rows, text bytes and seconds."""
+    start = time.perf_counter()
+    conn = PROFILES[profile](path)
+    columns = [c[1] for c in sqlite_schema(conn, "chat")]
+    rows = nbytes = 0
+    for row in stream_sqlite_rows(conn, "chat", columns, table_filter):
+        rows += 1
+        nbytes += sum(len(v) for v in row if isinstance(v, str))
+    conn.close()
+    return rows, nbytes, time.perf_counter() - start
+
+
+def main():
+    """Generate the dataset and print the best of `--repeat` runs per scan and profile."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scan and profile")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "webui.db"
+        generate(path, args.rows)
+        print(f"{args.rows:,} rows, {path.stat().st_size / 1_000_000:.1f} MB")
+
+        for scan_name, table_filter in SCANS.items():
+            best = {}
+            for _ in range(args.repeat):
+                # Alternate profiles so both see the same state of the OS cache.
+                for profile in PROFILES:
+                    result = scan(path, profile, table_filter)
+                    if profile not in best or result[2] < best[profile][2]:
+                        best[profile] = result
+            for profile, (rows, nbytes, seconds) in best.items():
+                print(
+                    f"{scan_name:>6} {profile:>9}: {seconds:6.2f}s "
+                    f"{rows / seconds:12,.0f} rows/s {nbytes / seconds / 1_000_000:8.1f} MB/s"
+                )
+            speedup = best["default"][2] / best["bulk-read"][2]
+            print(f"{scan_name:>6} speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,26 +5,65 @@ SQLite to PostgreSQL migration for Open WebUI
 
 import os
 import sys
+import importlib.util
 import json
 import sqlite3
 import csv
 import argparse
 import time
+import gzip
+import hashlib
+import re
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager, nullcontext
+from datetime import datetime, timezone
+from dataclasses import dataclass, field, replace
+from itertools import chain, islice
 from pathlib import Path
-from typing import Dict, Iterable, List
-from io import StringIO
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple, Union
+from io import BytesIO, StringIO
 import shutil
 import tempfile
 
 
-import psycopg2
-from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn
-from rich.panel import Panel
-from rich.table import Table
+def _lazy_import(name: str):
+    """Module that is only loaded on first attribute access."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# psycopg2 and rich are loaded when first used, so that `--help` and
+# importing this module as a library stay cheap.
+psycopg2 = _lazy_import("psycopg2")
+
+
+class _LazyConsole:
+    """The rich Console, created on first use."""
+
+    def __init__(self):
+        self._console = None
+
+    def get(self):
+        if self._console is None:
+            from rich.console import Console  # pylint: disable=import-outside-toplevel
+            self._console = Console()
+        return self._console
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
 
 __version__ = "0.1.22"
-console = Console()
+console = _LazyConsole()
 
 
 def parse_args():
@@ -35,14 +74,31 @@ def parse_args():
     )
     parser.add_argument(
         "--dry-run",
-        action="store_true",
-        help="Validate and preview migration without writing to PostgreSQL",
+        nargs="?",
+        const="plan",
+        default=False,
+        choices=["plan", "measure"],
+        help="Validate and preview migration without writing to PostgreSQL. "
+             "'--dry-run=measure' also reads, normalizes and encodes all rows "
+             "to predict duration and target size",
+    )
+    parser.add_argument(
+        "--sample-rows",
+        type=int,
+        default=None,
+        help="With --dry-run=measure, only read the first N rows of each table "
+             "and extrapolate",
     )
     parser.add_argument(
         "--sqlite-counts",
         action="store_true",
         help="Show row counts for all SQLite tables and exit",
     )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="With --sqlite-counts, show row counts from sqlite_stat1 instead of counting",
+    )
     parser.add_argument(
         "--postgres-counts",
         action="store_true",
@@ -53,6 +109,198 @@ def parse_args():
         action="store_true",
         help="Validate migrated data by comparing row counts",
     )
+    parser.add_argument(
+        "--extract",
+        metavar="DIR",
+        type=Path,
+        help="Write all tables as compressed COPY files plus a manifest to DIR "
+             "and exit. Does not connect to PostgreSQL",
+    )
+    parser.add_argument(
+        "--load",
+        metavar="DIR",
+        type=Path,
+        help="Load files written by --extract from DIR into PostgreSQL and exit",
+    )
+    parser.add_argument(
+        "--load-shard",
+        metavar="K/N",
+        type=shard_spec,
+        default=(1, 1),
+        help="With --load, copy only the K-th of every N files, so N machines can "
+             "share the load (default: 1/1)",
+    )
+    parser.add_argument(
+        "--load-step",
+        choices=LOAD_STEPS,
+        action="append",
+        help="With --load, run only this step: empty the tables, copy the files, or "
+             "finalize the tables (can be repeated; default: all)",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=100_000,
+        help="Rows per file with --extract, and per COPY chunk with "
+             "--reject-file or --transaction per-chunk (default: 100000)",
+    )
+    parser.add_argument(
+        "--transaction",
+        choices=TRANSACTION_POLICIES,
+        default="per-table",
+        help="Commit once for the whole run (atomic), after each table "
+             "(per-table, default), or every --chunk-rows rows (per-chunk)",
+    )
+    parser.add_argument(
+        "--small-table-rows",
+        type=int,
+        help="Tables with at most this many rows are migrated in groups, with "
+             "one TRUNCATE and one commit per group (default: 1000, 0 disables)",
+    )
+    parser.add_argument(
+        "--load-mode",
+        choices=["truncate", "merge"],
+        default="truncate",
+        help="'truncate' (default) empties each table before loading. 'merge' "
+             "loads into an unlogged staging table and upserts by primary key, "
+             "keeping rows that are already in PostgreSQL",
+    )
+    parser.add_argument(
+        "--reject-file",
+        metavar="FILE",
+        type=Path,
+        help="COPY in chunks and write rows PostgreSQL rejects to FILE (JSONL), "
+             "instead of failing the whole table",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        help="Files loaded in parallel with --load, tables finalized in parallel after "
+        "loading, or tables counted in parallel with --sqlite-counts and --validate "
+        "(default: 4)",
+    )
+    parser.add_argument(
+        "--skip-finalize",
+        action="store_true",
+        help="Do not set sequences past the loaded ids and ANALYZE the tables "
+             "after loading",
+    )
+    parser.add_argument(
+        "--vacuum-freeze-rows",
+        metavar="ROWS",
+        type=int,
+        help="Run VACUUM (FREEZE, ANALYZE) instead of ANALYZE on tables with at "
+             "least ROWS rows",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["psycopg2", "async"],
+        default="psycopg2",
+        help="Database engine. 'async' uses psycopg 3 async COPY with a "
+             "connection pool and copies several tables at once "
+             "(needs psycopg 3: pip install 'open-webui-sqlite-migration[async]')",
+    )
+    parser.add_argument(
+        "--max-streams",
+        type=int,
+        default=4,
+        help="Tables copied at the same time with --engine async (default: 4)",
+    )
+    parser.add_argument(
+        "--max-rate",
+        metavar="MB/S",
+        type=float,
+        help="Upper limit of COPY data per second, shared by all streams, e.g. 20",
+    )
+    parser.add_argument(
+        "--throttle-on",
+        choices=sorted(THROTTLE_TARGETS),
+        help="Halve the COPY rate while replication lag or commit latency is above "
+             "--throttle-target, and raise it again by 1 MB/s while it is below",
+    )
+    parser.add_argument(
+        "--throttle-target",
+        metavar="SECONDS",
+        type=float,
+        help="Replication lag or commit latency to stay under with --throttle-on "
+             "(default: 10 for replication-lag, 1 for commit-latency)",
+    )
+    parser.add_argument(
+        "--tenants",
+        metavar="FILE",
+        type=Path,
+        help="Migrate many SQLite databases listed in a JSON manifest, "
+             "concurrently, and exit",
+    )
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=4,
+        help="Tenants migrated at the same time with --tenants (default: 4)",
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=None,
+        help="Upper limit of PostgreSQL connections open at the same time "
+             "with --tenants (default: --max-parallel)",
+    )
+    parser.add_argument(
+        "--include",
+        metavar="TABLE[,TABLE]",
+        type=table_names,
+        action="extend",
+        help="Migrate only these tables (can be repeated)",
+    )
+    parser.add_argument(
+        "--exclude",
+        metavar="TABLE[,TABLE]",
+        type=table_names,
+        action="extend",
+        help="Do not migrate these tables (can be repeated)",
+    )
+    parser.add_argument(
+        "--where",
+        metavar="TABLE:CONDITION",
+        type=table_condition,
+        action="append",
+        help="Migrate only rows of TABLE matching the SQLite CONDITION; tables that "
+             "reference it are filtered to match (can be repeated)",
+    )
+    parser.add_argument(
+        "--order",
+        metavar="TABLE:COLUMNS",
+        type=table_order,
+        action="append",
+        help="Load TABLE sorted by COLUMNS, e.g. 'chat:user_id, updated_at', through "
+             "a matching SQLite index when there is one (can be repeated)",
+    )
+    parser.add_argument(
+        "--exclude-column",
+        metavar="TABLE.COLUMN",
+        type=table_column,
+        action="append",
+        help="Leave COLUMN out, so PostgreSQL fills in its default (can be repeated)",
+    )
+    parser.add_argument(
+        "--compact-json",
+        action="store_true",
+        help="Write JSON values without whitespace, and report the bytes saved",
+    )
+    parser.add_argument(
+        "--progress",
+        choices=["auto", "bar", "log", "none"],
+        default="auto",
+        help="Progress display: live bars, periodic log lines (CI), or none. "
+             "'auto' uses bars on a terminal and log lines otherwise",
+    )
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between progress lines in log mode (default: 10)",
+    )
     args, unknown = parser.parse_known_args()
     if unknown:
         console.print(f"[yellow]Warning: Unknown option(s): {', '.join(unknown)}[/yellow]")
@@ -60,7 +308,47 @@ def parse_args():
         sys.exit(1)
     return args
 
-DRY_RUN = False
+def table_names(value: str) -> List[str]:
+    """Comma separated table names."""
+    return [t.strip() for t in value.split(",") if t.strip()]
+
+def _table_prefixed(value: str, what: str) -> Tuple[str, str]:
+    table, sep, rest = value.partition(":")
+    if not sep or not table.strip() or not rest.strip():
+        raise argparse.ArgumentTypeError(f"expected TABLE:{what}, got {value!r}")
+    return table.strip(), rest.strip()
+
+def table_condition(value: str) -> Tuple[str, str]:
+    """`TABLE:CONDITION` of `--where`."""
+    return _table_prefixed(value, "CONDITION")
+
+def table_order(value: str) -> Tuple[str, str]:
+    """`TABLE:COLUMNS` of `--order`."""
+    return _table_prefixed(value, "COLUMNS")
+
+def table_column(value: str) -> Tuple[str, str]:
+    """`TABLE.COLUMN` of `--exclude-column`."""
+    table, sep, column = value.partition(".")
+    if not sep or not table or not column:
+        raise argparse.ArgumentTypeError(f"expected TABLE.COLUMN, got {value!r}")
+    return table, column
+
+def shard_spec(value: str) -> Tuple[int, int]:
+    """`K/N` of `--load-shard`, with 1 <= K <= N."""
+    index, sep, count = value.partition("/")
+    try:
+        shard = (int(index), int(count))
+    except ValueError:
+        shard = (0, 0)
+    if not sep or not 1 <= shard[0] <= shard[1]:
+        raise argparse.ArgumentTypeError(f"expected K/N with 1 <= K <= N, got {value!r}")
+    return shard
+
+TRANSACTION_POLICIES = ["atomic", "per-table", "per-chunk"]
+
+LOAD_STEPS = ["truncate", "copy", "finalize"]
+
+SMALL_TABLE_ROWS = 1000
 
 def env(key: str, default=None, *, required=False, cast=str):
     """Get required environment variables."""
@@ -72,8 +360,6 @@ def env(key: str, default=None, *, required=False, cast=str):
     except Exception:
         raise RuntimeError(f"Invalid value for {key}: {value}")
 
-SQLITE_PATH = Path(env("SQLITE_DB_PATH", required=True))
-MIGRATE_DATABASE_URL = env("MIGRATE_DATABASE_URL", required=True)
 
 def copy_sqlite_db(src: Path) -> Path:
     """
@@ -102,17 +388,99 @@ def validate_postgres(db_url: str) -> None:
     conn = psycopg2.connect(db_url)
     conn.close()
 
-def sqlite_row_counts(conn: sqlite3.Connection, tables: List[str]) -> Dict[str, int]:
-    """Get row counts for all tables."""
+def sqlite_row_counts(
+    conn: sqlite3.Connection,
+    tables: List[str],
+    filters: Optional[Dict[str, "TableFilter"]] = None,
+) -> Dict[str, int]:
+    """Get row counts for all tables, of the rows `filters` keep."""
     counts = {}
     for table in tables:
+        where = filters[table].where if filters and table in filters else None
         try:
-            count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            count = conn.execute(
+                f'SELECT COUNT(*) FROM "{table}"' + (f" WHERE {where}" if where else "")
+            ).fetchone()[0]
             counts[table] = count
         except sqlite3.Error:
             counts[table] = -1
     return counts
 
+# Map up to 64 GiB of the database file instead of reading it through the page cache.
+SQLITE_READ_MMAP_BYTES = 1 << 36
+# Page cache of each read connection, in KiB.
+SQLITE_READ_CACHE_KIB = 64 * 1024
+
+
+def sqlite_bulk_read(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Set up a connection for full table scans.
+
+    The file is memory mapped, the page cache is larger, sorts without an
+    index stay in memory, and writes are refused.
+    """
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_READ_MMAP_BYTES}")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_READ_CACHE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def open_sqlite_snapshot(path: Path) -> sqlite3.Connection:
+    """Open the temporary copy of the SQLite database to migrate from, see `sqlite_bulk_read`."""
+    return sqlite_bulk_read(sqlite3.connect(path, timeout=60, check_same_thread=False))
+
+
+def open_sqlite_readonly(path: Path) -> sqlite3.Connection:
+    """Open the SQLite database in place, read-only, without copying it."""
+    return sqlite_bulk_read(sqlite3.connect(
+        f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, timeout=60,
+        check_same_thread=False,
+    ))
+
+def sqlite_row_counts_parallel(
+    path: Path,
+    tables: List[str],
+    jobs: int = 4,
+    filters: Optional[Dict[str, "TableFilter"]] = None,
+) -> Dict[str, int]:
+    """Row counts of tables, counted on `jobs` read-only connections at once.
+
+    Each connection reads its own snapshot, so counts of a database in use
+    may be from slightly different points in time.
+    """
+    local = threading.local()
+    conns = []
+    lock = threading.Lock()
+
+    def count(table):
+        if not hasattr(local, "conn"):
+            local.conn = open_sqlite_readonly(path)
+            with lock:
+                conns.append(local.conn)
+        return sqlite_row_counts(local.conn, [table], filters)[table]
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            return dict(zip(tables, executor.map(count, tables)))
+    finally:
+        for conn in conns:
+            conn.close()
+
+def sqlite_row_estimates(conn: sqlite3.Connection, tables: List[str]) -> Dict[str, int]:
+    """Row counts from `sqlite_stat1`, as of the last ANALYZE.
+
+    Tables without statistics get -1.
+    """
+    estimates = dict.fromkeys(tables, -1)
+    try:
+        rows = conn.execute("SELECT tbl, stat FROM sqlite_stat1").fetchall()
+    except sqlite3.OperationalError:
+        return estimates
+    for table, stat in rows:
+        if table in estimates and stat:
+            estimates[table] = max(estimates[table], int(stat.split()[0]))
+    return estimates
+
 def postgres_row_counts(conn, tables: List[str]) -> Dict[str, int]:
     """Get row counts for all tables."""
     counts = {}
@@ -176,6 +544,7 @@ TABLE_DEPENDENCIES = {
     "channel_webhook": ["channel"],
     "channel_member": ["channel"],
     "chat_message": ["chat"],
+    "chatidtag": ["chat"],
     "message_reaction": ["message"],
 }
 
@@ -213,31 +582,216 @@ def sqlite_schema(conn: sqlite3.Connection, table: str):
     """Get SQLite schema."""
     return conn.execute(f'PRAGMA table_info("{table}")').fetchall()
 
-def pg_column_types(conn, table: str) -> Dict[str, str]:
+def select_tables(
+    tables: List[str], include: Iterable[str] = (), exclude: Iterable[str] = ()
+) -> List[str]:
+    """Tables in order, limited to `include` when given, without `exclude`."""
+    include, exclude = set(include), set(exclude)
+    return [t for t in tables if (not include or t in include) and t not in exclude]
+
+
+@dataclass
+class TableFilter:
+    """Rows and columns of a table to migrate, and the order to read them in."""
+
+    where: Optional[str] = None
+    exclude_columns: frozenset = frozenset()
+    order_by: Optional[str] = None
+
+    def columns(self, schema) -> List[str]:
+        """Columns of `sqlite_schema()` output that are migrated."""
+        return [c[1] for c in schema if c[1] not in self.exclude_columns]
+
+    def select_sql(self, table: str, columns: List[str]) -> str:
+        """SELECT of the rows, in `order_by` when set."""
+        col_sql = ", ".join(f'"{c}"' for c in columns)
+        sql = f'SELECT {col_sql} FROM "{table}"'
+        if self.where:
+            sql += f" WHERE {self.where}"
+        if self.order_by:
+            sql += f" ORDER BY {self.order_by}"
+        return sql
+
+
+def order_columns(order_by: str) -> List[str]:
+    """Column names of an ORDER BY list, without ASC/DESC."""
+    return [term.split()[0].strip('"') for term in order_by.split(",") if term.strip()]
+
+
+def sqlite_sorts(conn: sqlite3.Connection, sql: str) -> bool:
+    """Whether SQLite sorts the result of `sql` in a temporary B-tree."""
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    return any("TEMP B-TREE" in row[-1] and "ORDER BY" in row[-1] for row in plan)
+
+
+def check_filter_tables(
+    conn: sqlite3.Connection,
+    where: Optional[Dict[str, str]] = None,
+    exclude_columns: Optional[Dict[str, Iterable[str]]] = None,
+    order: Optional[Dict[str, str]] = None,
+) -> None:
+    """Raise ValueError when a filter names a table the SQLite database does not have."""
+    available = {
+        r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    }
+    for option, keys in (
+        ("--where", where), ("--exclude-column", exclude_columns), ("--order", order),
+    ):
+        unknown = sorted(set(keys or ()) - available)
+        if unknown:
+            raise ValueError(f"{option}: no such SQLite table: {', '.join(unknown)}")
+
+
+def table_filters(
+    conn: sqlite3.Connection,
+    tables: List[str],
+    where: Optional[Dict[str, str]] = None,
+    exclude_columns: Optional[Dict[str, Iterable[str]]] = None,
+    order: Optional[Dict[str, str]] = None,
+) -> Dict[str, TableFilter]:
+    """Filters of tables, with row predicates carried over to dependent tables.
+
+    A table in `TABLE_DEPENDENCIES` only keeps rows whose `<parent>_id`
+    points at a row its parent keeps, so `--where chat:...` also filters
+    `chat_message` and `chat_file`. Tables in `order` are read in that
+    order; SQLite's planner reads through a matching index when it can.
+    Raises ValueError for filters of tables SQLite does not have.
+    """
+    check_filter_tables(conn, where, exclude_columns, order)
+    where = where or {}
+    exclude_columns = exclude_columns or {}
+    order = order or {}
+    conditions: Dict[str, Optional[str]] = {}
+
+    def condition(table: str) -> Optional[str]:
+        if table not in conditions:
+            parts = [f"({where[table]})"] if table in where else []
+            columns = {c[1] for c in sqlite_schema(conn, table)}
+            for parent in TABLE_DEPENDENCIES.get(table, []):
+                ref = f"{parent}_id"
+                parent_condition = condition(parent)
+                if parent_condition and ref in columns:
+                    parts.append(
+                        f'("{ref}" IS NULL OR "{ref}" IN '
+                        f'(SELECT "id" FROM "{parent}" WHERE {parent_condition}))'
+                    )
+            conditions[table] = " AND ".join(parts) or None
+        return conditions[table]
+
+    return {
+        t: TableFilter(
+            condition(t),
+            frozenset(exclude_columns.get(t, ())),
+            order.get(t),
+        )
+        for t in tables
+    }
+
+# Declared SQLite column types, as written by Open WebUI, to Postgres types.
+SQLITE_TYPE_MAP = {
+    "JSON": "jsonb",
+    "TEXT": "text",
+    "VARCHAR": "character varying",
+}
+
+
+def sqlite_column_types(conn: sqlite3.Connection, table: str) -> Dict[str, str]:
+    """Postgres column types guessed from declared SQLite types.
+
+    Used when there is no Postgres catalog to ask, as with `--extract`.
+    """
+    types = {}
+    for col in sqlite_schema(conn, table):
+        declared = col[2].split("(")[0].strip().upper()
+        if declared in SQLITE_TYPE_MAP:
+            types[col[1]] = SQLITE_TYPE_MAP[declared]
+    return types
+
+
+def pg_column_types(conn, table: str, schema: str = "public") -> Dict[str, str]:
     """Postgres column types."""
     with conn.cursor() as cur:
         cur.execute("""
             SELECT column_name, data_type
             FROM information_schema.columns
-            WHERE table_schema = 'public'
+            WHERE table_schema = %s
               AND table_name = %s
-        """, (table,))
+        """, (schema, table))
         return dict(cur.fetchall())
 
+def pg_column_types_bulk(
+    conn, tables: List[str], schema: str = "public"
+) -> Dict[str, Dict[str, str]]:
+    """Postgres column types of many tables, in one query."""
+    types = {t: {} for t in tables}
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT table_name, column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = %s
+              AND table_name = ANY(%s)
+        """, (schema, list(tables)))
+        for table, column, data_type in cur.fetchall():
+            types[table][column] = data_type
+    return types
+
+PG_COLUMN_LENGTHS_SQL = """
+    SELECT table_name, column_name, character_maximum_length
+    FROM information_schema.columns
+    WHERE table_schema = %s
+      AND table_name = ANY(%s)
+      AND character_maximum_length IS NOT NULL
+"""
+
+
+def pg_column_lengths_bulk(
+    conn, tables: List[str], schema: str = "public"
+) -> Dict[str, Dict[str, int]]:
+    """Maximum lengths of `character varying(n)` columns of many tables, in one query."""
+    lengths = {t: {} for t in tables}
+    with conn.cursor() as cur:
+        cur.execute(PG_COLUMN_LENGTHS_SQL, (schema, list(tables)))
+        for table, column, length in cur.fetchall():
+            lengths[table][column] = length
+    return lengths
+
 def stream_sqlite_rows(
     conn: sqlite3.Connection,
     table: str,
     columns: List[str],
+    table_filter: Optional[TableFilter] = None,
 ) -> Iterable[tuple]:
-    col_sql = ", ".join(f'"{c}"' for c in columns)
-    cur = conn.execute(f'SELECT {col_sql} FROM "{table}"')
+    """Rows of a SQLite table, selected and ordered by `table_filter` if given.
+
+    Text is decoded by SQLite itself. If a value is not valid UTF-8, the
+    rest of the table is read again with text as bytes, which
+    `normalize_row()` decodes and repairs.
+    """
+    sql = (table_filter or TableFilter()).select_sql(table, columns)
+    cur = conn.execute(sql)
 
+    done = 0
     while True:
-        rows = cur.fetchmany(500)
-        if not rows:
+        try:
+            rows = cur.fetchmany(500)
+        except sqlite3.OperationalError as e:
+            if "decode" not in str(e):
+                raise
             break
+        if not rows:
+            return
         for row in rows:
             yield row
+        done += len(rows)
+
+    text_factory = conn.text_factory
+    conn.text_factory = bytes
+    try:
+        cur = conn.execute(sql)
+        for row in islice(iter(cur.fetchone, None), done, None):
+            yield row
+    finally:
+        conn.text_factory = text_factory
 
 NOT_NULL_COLUMNS = {
     "prompt": {"content"},
@@ -248,40 +802,330 @@ NOT_NULL_COLUMNS = {
 TEXT_TYPES = {"text", "character varying", "varchar"}
 
 
-def normalize_row(row, columns, pg_types, table_name=None):
-    """Normalize DB row in Postgres."""
+# `\u0000` escapes in JSON text, not themselves escaped by a backslash.
+JSON_NUL_ESCAPE = re.compile(r"(?<!\\)((?:\\\\)*)\\u0000")
+
+
+def _strip_nul(text: str) -> str:
+    """Remove `\\u0000` escapes from JSON text, leaving everything else as written."""
+    return JSON_NUL_ESCAPE.sub(r"\1", text)
+
+
+JSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[^ \t\n\r"]+')
+
+
+def compact_json_value(original: str) -> Tuple[str, int]:
+    """JSON text `original` without whitespace, and the UTF-8 bytes saved.
+
+    Only whitespace between tokens is dropped: numbers, strings and escapes
+    are kept as written, so `1E5` or a number with more digits than a float
+    holds reach Postgres unchanged. `original` must be valid JSON.
+    """
+    compact = "".join(JSON_TOKEN.findall(original))
+    return compact, len(original.encode("utf-8")) - len(compact.encode("utf-8"))
+
+
+def normalize_row(
+    row,
+    columns,
+    pg_types,
+    table_name=None,
+    rewrites: Optional[Counter] = None,
+    max_lengths: Optional[Dict[str, int]] = None,
+    compact_json: Optional[Counter] = None,
+):
+    """Normalize DB row in Postgres.
+
+    Text that Postgres would reject is repaired: invalid UTF-8 is replaced,
+    NUL characters are removed, and values longer than `max_lengths` allows
+    are cut. If `rewrites` is given, it counts changed values per
+    `(column, reason)`. If `compact_json` is given, jsonb values are
+    written without whitespace and the bytes saved are counted per column.
+    """
     out = []
     for value, col in zip(row, columns):
         col_type = pg_types.get(col)
+        if isinstance(value, bytes) and col_type != "bytea":
+            try:
+                value = value.decode("utf-8")
+            except UnicodeDecodeError:
+                value = value.decode("utf-8", errors="replace")
+                if rewrites is not None:
+                    rewrites[(col, "invalid utf-8")] += 1
         if value is None:
             not_null_cols = NOT_NULL_COLUMNS.get(table_name, set())
             if col in not_null_cols and col_type in TEXT_TYPES:
                 out.append("")
+                if rewrites is not None:
+                    rewrites[(col, "null to empty string")] += 1
             else:
                 out.append("__NULL__")
         elif col_type == "jsonb":
             if isinstance(value, (dict, list)):
-                out.append(json.dumps(value))
+                if compact_json is not None:
+                    out.append(compact_json_value(json.dumps(value))[0])
+                else:
+                    out.append(json.dumps(value))
             else:
+                nul = "\x00" in value
+                if nul:
+                    value = value.replace("\x00", "")
                 try:
                     json.loads(value)
+                    if "\\u0000" in value:
+                        stripped = _strip_nul(value)
+                        nul = nul or stripped != value
+                        value = stripped
+                    if compact_json is not None:
+                        value, saved = compact_json_value(value)
+                        compact_json[col] += saved
                     out.append(value)
+                    if nul and rewrites is not None:
+                        rewrites[(col, "nul removed")] += 1
                 except Exception:
                     out.append("{}")
+                    if rewrites is not None:
+                        rewrites[(col, "invalid json")] += 1
+        elif col_type in TEXT_TYPES and isinstance(value, str):
+            if "\x00" in value:
+                value = value.replace("\x00", "")
+                if rewrites is not None:
+                    rewrites[(col, "nul removed")] += 1
+            if max_lengths and col in max_lengths and len(value) > max_lengths[col]:
+                value = value[:max_lengths[col]]
+                if rewrites is not None:
+                    rewrites[(col, f"cut to {max_lengths[col]} characters")] += 1
+            out.append(value)
         else:
             out.append(value)
     return tuple(out)
 
 
+THROTTLE_TARGETS = {"replication-lag": 10.0, "commit-latency": 1.0}
+THROTTLE_MIN_RATE = 1_000_000
+THROTTLE_STEP = 1_000_000
+REPLICATION_LAG_INTERVAL = 5.0
+COMMIT_LATENCY_INTERVAL = 1.0
+
+
+class Throttle:
+    """Limit of COPY bytes per second, shared by all streams of a run.
+
+    `wait(nbytes)` sleeps until `nbytes` more fit in `rate` bytes per
+    second; `reserve(nbytes)` only returns the seconds to wait, for async
+    callers. `rate=None` means no limit.
+
+    With a `target`, `observe(value)` adapts the rate additive-increase,
+    multiplicative-decrease: a value above the target (replication lag or
+    commit latency in seconds) halves the rate, down to `min_rate`, and a
+    value at or below it raises the rate by `step`, up to `max_rate`.
+    """
+
+    def __init__(
+        self,
+        max_rate: Optional[float] = None,
+        target: Optional[float] = None,
+        step: float = THROTTLE_STEP,
+        min_rate: float = THROTTLE_MIN_RATE,
+        window: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.target = target
+        self.step = step
+        self.min_rate = min_rate
+        self.window = window
+        self.backoffs = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next = clock()
+        self._recent: Deque[Tuple[float, int]] = deque()
+        self._recent_bytes = 0
+
+    def reserve(self, nbytes: int) -> float:
+        """Book `nbytes` and return the seconds to wait before sending more."""
+        with self._lock:
+            now = self._clock()
+            self._recent.append((now, nbytes))
+            self._recent_bytes += nbytes
+            if self.rate is None:
+                return 0.0
+            start = max(self._next, now)
+            self._next = start + nbytes / self.rate
+            return start - now
+
+    def wait(self, nbytes: int) -> None:
+        """Book `nbytes` and sleep as long as the rate requires."""
+        delay = self.reserve(nbytes)
+        if delay > 0:
+            self._sleep(delay)
+
+    def effective_rate(self) -> float:
+        """Bytes per second booked over the last `window` seconds."""
+        with self._lock:
+            return self._effective_rate(self._clock())
+
+    def _effective_rate(self, now: float) -> float:
+        while self._recent and now - self._recent[0][0] > self.window:
+            self._recent_bytes -= self._recent.popleft()[1]
+        if not self._recent:
+            return 0.0
+        return self._recent_bytes / max(now - self._recent[0][0], 1.0)
+
+    def observe(self, value: float) -> None:
+        """Adapt the rate to a replication lag or commit latency, in seconds."""
+        if self.target is None:
+            return
+        with self._lock:
+            if value > self.target:
+                current = self.rate or self._effective_rate(self._clock())
+                self.rate = max(current / 2, self.min_rate)
+                self.backoffs += 1
+            elif self.rate is not None:
+                self.rate += self.step
+                if self.max_rate is not None:
+                    self.rate = min(self.rate, self.max_rate)
+
+    def status(self) -> str:
+        """Effective and allowed rate, for progress output."""
+        limit = "no limit" if self.rate is None else f"limit {format_bytes_rate(self.rate)}"
+        return f"effective {format_bytes_rate(self.effective_rate())} ({limit})"
+
+
+def make_throttle(
+    max_rate: Optional[float] = None,
+    throttle_on: Optional[str] = None,
+    throttle_target: Optional[float] = None,
+) -> Optional[Throttle]:
+    """Throttle for `--max-rate` in MB/s and `--throttle-on`, or None without either."""
+    if max_rate is None and throttle_on is None:
+        return None
+    target = None
+    if throttle_on is not None:
+        target = throttle_target if throttle_target is not None else THROTTLE_TARGETS[throttle_on]
+    return Throttle(max_rate * 1_000_000 if max_rate else None, target)
+
+
+def pg_replication_lag(conn) -> float:
+    """Largest replay lag of the standbys, in seconds, 0 without standbys."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT COALESCE(MAX(EXTRACT(EPOCH FROM replay_lag)), 0) FROM pg_stat_replication"
+        )
+        return float(cur.fetchone()[0])
+
+
+def pg_commit_latency(conn) -> float:
+    """Seconds to run and commit a transaction that takes a transaction id.
+
+    `conn` is in autocommit mode. With a transaction id the commit writes and
+    flushes WAL, and waits for synchronous standbys, as a COPY commit does.
+    """
+    start = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute("SELECT txid_current()")
+    return time.perf_counter() - start
+
+
+class ThrottleMonitor:
+    """Feed `measure()` of the cluster to a throttle every `interval` seconds, in a thread.
+
+    Uses its own connection, since the migration connections are busy with
+    COPY. Subclasses set `measure` and the `name` used in warnings.
+    """
+
+    name = "Cluster"
+    interval = REPLICATION_LAG_INTERVAL
+
+    def __init__(self, db_url: str, throttle: Throttle, interval: Optional[float] = None):
+        self.db_url = db_url
+        self.throttle = throttle
+        if interval is not None:
+            self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def measure(self, conn) -> float:
+        """The value to observe, in seconds."""
+        raise NotImplementedError
+
+    def _run(self):
+        try:
+            conn = psycopg2.connect(self.db_url)
+        except psycopg2.Error as e:
+            console.print(f"[yellow]{self.name} is not monitored: {e}[/]")
+            return
+        conn.autocommit = True
+        try:
+            while not self._stop.wait(self.interval):
+                self.throttle.observe(self.measure(conn))
+        except psycopg2.Error as e:
+            console.print(f"[yellow]{self.name} is no longer monitored: {e}[/]")
+        finally:
+            conn.close()
+
+
+class ReplicationLagMonitor(ThrottleMonitor):
+    """Observe `pg_replication_lag()`.
+
+    Reading the lag of other users' standbys needs the `pg_monitor` role.
+    """
+
+    name = "Replication lag"
+
+    def measure(self, conn) -> float:
+        return pg_replication_lag(conn)
+
+
+class CommitLatencyMonitor(ThrottleMonitor):
+    """Observe `pg_commit_latency()` of small probe commits.
+
+    The migration commits once per table, or once in all with `atomic`, which
+    is too rare to adapt the rate by; the probes keep the throttle informed
+    between those commits.
+    """
+
+    name = "Commit latency"
+    interval = COMMIT_LATENCY_INTERVAL
+
+    def measure(self, conn) -> float:
+        return pg_commit_latency(conn)
+
+
 COPY_NULL_MARKER = "__NULL__"
 
 class CopyStream:
-    """Streaming file-like object for psycopg2 COPY."""
+    """Streaming file-like object for psycopg2 COPY.
+
+    If `on_progress` is given, it is called as `on_progress(rows, nbytes)`
+    once per `read()` with the rows and UTF-8 bytes handed to COPY since
+    the previous call. With a `throttle`, `read()` waits as long as its
+    rate requires.
+    """
 
-    def __init__(self, row_iter):
+    def __init__(
+        self,
+        row_iter,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        throttle: Optional[Throttle] = None,
+    ):
         self.row_iter = row_iter
+        self.on_progress = on_progress
+        self.throttle = throttle
         self._buffer = ""
         self._exhausted = False
+        self._pending_rows = 0
 
     def _next_line(self):
         try:
@@ -289,6 +1133,7 @@ class CopyStream:
         except StopIteration:
             self._exhausted = True
             return ""
+        self._pending_rows += 1
 
         output = StringIO()
         writer = csv.writer(
@@ -311,203 +1156,2385 @@ class CopyStream:
         result = self._buffer[:size]
         self._buffer = self._buffer[size:]
 
+        if result and (self.on_progress is not None or self.throttle is not None):
+            # `size` counts characters; rates and limits are in bytes sent.
+            nbytes = len(result.encode("utf-8"))
+            if self.on_progress is not None:
+                self.on_progress(self._pending_rows, nbytes)
+                self._pending_rows = 0
+            if self.throttle is not None:
+                self.throttle.wait(nbytes)
+
         return result
 
-def migrate_table(sqlite_conn: sqlite3.Connection, pg_conn, table: str):
-    """Migrate a table."""
-    start_time = time.time()
-    sqlite_count = sqlite_conn.execute(
-        f'SELECT COUNT(*) FROM "{table}"'
-    ).fetchone()[0]
+def format_bytes_rate(bytes_per_second: float) -> str:
+    """Human readable MB/s."""
+    return f"{bytes_per_second / 1_000_000:.1f} MB/s"
 
-    console.print(
-        f"[cyan]Table:[/] {table} "
-        f"[dim](rows: {sqlite_count})[/]"
-    )
 
-    if DRY_RUN:
-        console.print(f"[yellow]DRY-RUN: for {table}[/]")
-        return
+def format_eta(seconds: Optional[float]) -> str:
+    """Human readable remaining time."""
+    if seconds is None:
+        return "-:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
 
-    schema = sqlite_schema(sqlite_conn, table)
-    columns = [c[1] for c in schema]
-    pg_types = pg_column_types(pg_conn, table)
-    with pg_conn.cursor() as cur:
-        cur.execute(f"TRUNCATE TABLE {pg_ident(table)} CASCADE")
-    pg_conn.commit()
 
-    row_iter = (
-        normalize_row(row, columns, pg_types, table)
-        for row in stream_sqlite_rows(sqlite_conn, table, columns)
-    )
+def _rate_columns():
+    """Rows/s and MB/s columns for rich progress bars."""
+    from rich.progress import ProgressColumn  # pylint: disable=import-outside-toplevel
 
-    with pg_conn.cursor() as cur:
-        cur.copy_expert(
-            f"COPY {pg_ident(table)} ({', '.join(columns)}) "
-            f"FROM STDIN WITH CSV NULL '{COPY_NULL_MARKER}'",
-            CopyStream(row_iter),
+    class RowRateColumn(ProgressColumn):
+        """Rows per second for a progress task."""
+
+        def render(self, task):
+            speed = task.finished_speed or task.speed
+            return f"{speed or 0:,.0f} rows/s"
+
+    class ByteRateColumn(ProgressColumn):
+        """MB/s for a progress task, from the `bytes` task field."""
+
+        def render(self, task):
+            elapsed = task.elapsed or 0
+            nbytes = task.fields.get("bytes", 0)
+            return format_bytes_rate(nbytes / elapsed if elapsed else 0)
+
+    return RowRateColumn(), ByteRateColumn()
+
+
+class RichProgressReporter:
+    """Live progress bars: one per running table plus an overall bar.
+
+    With a `throttle`, the overall bar shows its effective and allowed rate.
+    """
+
+    def __init__(self, total_rows: int, total_tables: int, throttle: Optional[Throttle] = None):
+        # pylint: disable-next=import-outside-toplevel
+        from rich.progress import (
+            Progress, SpinnerColumn, BarColumn, TextColumn, TimeRemainingColumn,
         )
-    elapsed = time.time() - start_time
-    console.print(f"[green]Migrated {table} in {elapsed:.2f}s[/]")
 
-def main():
-    """ Run the script """
-    global DRY_RUN
-    args = parse_args()
-    DRY_RUN = args.dry_run
+        self.total_tables = total_tables
+        self.done_tables = 0
+        self.throttle = throttle
+        self._tasks = {}
+        self._bytes = {}
+        self._lock = threading.Lock()
+        self._progress = Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TextColumn("{task.completed:,.0f}/{task.total:,.0f}"),
+            *_rate_columns(),
+            TimeRemainingColumn(),
+            console=console.get(),
+        )
+        self._overall = self._progress.add_task(
+            self._overall_description(), total=total_rows, bytes=0
+        )
+        self._bytes[self._overall] = 0
+
+    def _overall_description(self):
+        description = f"Overall ({self.done_tables}/{self.total_tables} tables)"
+        if self.throttle is not None:
+            description += f" {self.throttle.status()}"
+        return description
+
+    def __enter__(self):
+        self._progress.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._progress.stop()
+
+    def start_table(self, table: str, total_rows: int):
+        with self._lock:
+            task_id = self._progress.add_task(table, total=total_rows, bytes=0)
+            self._tasks[table] = task_id
+            self._bytes[task_id] = 0
+
+    def advance(self, table: str, rows: int, nbytes: int):
+        with self._lock:
+            for task_id in (self._tasks[table], self._overall):
+                self._bytes[task_id] += nbytes
+                self._progress.update(task_id, advance=rows, bytes=self._bytes[task_id])
+            if self.throttle is not None:
+                self._progress.update(self._overall, description=self._overall_description())
+
+    def finish_table(self, table: str):
+        with self._lock:
+            self.done_tables += 1
+            task_id = self._tasks.pop(table)
+            del self._bytes[task_id]
+            self._progress.remove_task(task_id)
+            self._progress.update(self._overall, description=self._overall_description())
+
+
+class _Counter:
+    """Rows and bytes seen for one table, or for the whole run."""
+
+    def __init__(self, total_rows: int, now: float):
+        self.total_rows = total_rows
+        self.rows = 0
+        self.bytes = 0
+        self.started = now
+
+    def line(self, name: str, now: float) -> str:
+        elapsed = max(now - self.started, 1e-9)
+        row_rate = self.rows / elapsed
+        eta = (self.total_rows - self.rows) / row_rate if row_rate else None
+        percent = 100 * self.rows / self.total_rows if self.total_rows else 100.0
+        return (
+            f"{name}: {self.rows:,}/{self.total_rows:,} rows ({percent:.1f}%) "
+            f"{row_rate:,.0f} rows/s {format_bytes_rate(self.bytes / elapsed)} "
+            f"ETA {format_eta(eta)}"
+        )
 
-    if args.sqlite_counts:
-        sqlite_copy_path = copy_sqlite_db(SQLITE_PATH)
-        validate_sqlite(sqlite_copy_path)
-        sqlite_conn = sqlite3.connect(sqlite_copy_path, timeout=60)
-        all_tables = sqlite_conn.execute(
-            "SELECT name FROM sqlite_master WHERE type='table'"
-        ).fetchall()
-        tables = sorted([r[0] for r in all_tables])
-        counts = sqlite_row_counts(sqlite_conn, tables)
-        total = sum(counts.values())
-
-        table = Table(title="SQLite Row Counts")
-        table.add_column("Table", style="cyan")
-        table.add_column("Rows", justify="right", style="green")
-        for t in tables:
-            table.add_row(t, f"{counts[t]:,}")
-        table.add_row("[bold]Total[/]", f"[bold]{total:,}[/]")
-        console.print(table)
 
-        sqlite_conn.close()
-        shutil.rmtree(sqlite_copy_path.parent, ignore_errors=True)
-        return
+class LogProgressReporter:
+    """Progress as plain log lines, every `interval` seconds, for CI and Kubernetes logs.
 
-    if args.postgres_counts:
-        pg_conn = psycopg2.connect(MIGRATE_DATABASE_URL)
-        with pg_conn.cursor() as cur:
-            cur.execute(
-                "SELECT table_name FROM information_schema.tables "
-                "WHERE table_schema = 'public'"
+    With a `throttle`, the overall line ends with its effective and allowed rate.
+    """
+
+    def __init__(
+        self,
+        total_rows: int,
+        total_tables: int,
+        interval: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+        throttle: Optional[Throttle] = None,
+    ):
+        self.total_tables = total_tables
+        self.done_tables = 0
+        self.interval = interval
+        self.throttle = throttle
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tables: Dict[str, _Counter] = {}
+        self._overall = _Counter(total_rows, clock())
+        self._last_log = self._overall.started
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.log(self._clock())
+
+    def start_table(self, table: str, total_rows: int):
+        with self._lock:
+            self._tables[table] = _Counter(total_rows, self._clock())
+
+    def advance(self, table: str, rows: int, nbytes: int):
+        with self._lock:
+            for counter in (self._tables[table], self._overall):
+                counter.rows += rows
+                counter.bytes += nbytes
+            now = self._clock()
+            if now - self._last_log >= self.interval:
+                self._log(now)
+
+    def finish_table(self, table: str):
+        with self._lock:
+            self.done_tables += 1
+            console.print(
+                self._tables.pop(table).line(f"[progress] {table} done", self._clock()),
+                markup=False,
             )
-            tables = sorted([r[0] for r in cur.fetchall()])
-        counts = postgres_row_counts(pg_conn, tables)
-        total = sum(c for c in counts.values() if c >= 0)
-
-        table = Table(title="PostgreSQL Row Counts")
-        table.add_column("Table", style="cyan")
-        table.add_column("Rows", justify="right", style="green")
-        for t in tables:
-            table.add_row(t, f"{counts[t]:,}")
-        table.add_row("[bold]Total[/]", f"[bold]{total:,}[/]")
-        console.print(table)
 
-        pg_conn.close()
-        return
+    def log(self, now: float):
+        """Log current progress for running tables and overall."""
+        with self._lock:
+            self._log(now)
+
+    def _log(self, now: float):
+        self._last_log = now
+        for table, counter in self._tables.items():
+            console.print(counter.line(f"[progress] {table}", now), markup=False)
+        line = self._overall.line(
+            f"[progress] overall ({self.done_tables}/{self.total_tables} tables)", now
+        )
+        if self.throttle is not None:
+            line += f" {self.throttle.status()}"
+        console.print(line, markup=False)
 
-    if args.validate:
-        console.print(Panel("Validate Migration", style="cyan"))
 
-        sqlite_copy_path = copy_sqlite_db(SQLITE_PATH)
-        validate_sqlite(sqlite_copy_path)
-        sqlite_conn = sqlite3.connect(sqlite_copy_path, timeout=60)
+class NullProgressReporter:
+    """Progress reporter that reports nothing."""
 
-        sqlite_tables_list = sqlite_conn.execute(
-            "SELECT name FROM sqlite_master WHERE type='table'"
-        ).fetchall()
-        sqlite_all = sorted([r[0] for r in sqlite_tables_list])
-        sqlite_counts = sqlite_row_counts(sqlite_conn, sqlite_all)
-        sqlite_conn.close()
-        shutil.rmtree(sqlite_copy_path.parent, ignore_errors=True)
+    def __enter__(self):
+        return self
 
-        pg_conn = psycopg2.connect(MIGRATE_DATABASE_URL)
-        with pg_conn.cursor() as cur:
-            cur.execute(
-                "SELECT table_name FROM information_schema.tables "
-                "WHERE table_schema = 'public'"
-            )
-            pg_all = sorted([r[0] for r in cur.fetchall()])
-        pg_counts = postgres_row_counts(pg_conn, pg_all)
-        pg_conn.close()
+    def __exit__(self, *exc):
+        pass
 
-        all_tables = sorted(set(sqlite_all) | set(pg_all))
-        mismatches = []
-
-        result_table = Table(title="Validation Results")
-        result_table.add_column("Table", style="cyan")
-        result_table.add_column("SQLite", justify="right", style="yellow")
-        result_table.add_column("PostgreSQL", justify="right", style="green")
-        result_table.add_column("Status", justify="center")
-
-        for t in all_tables:
-            sqlite_count = sqlite_counts.get(t, 0)
-            pg_count = pg_counts.get(t, 0)
-            if sqlite_count == pg_count:
-                status = "[green]✓[/]"
-            elif sqlite_count == -1 or pg_count == -1:
-                status = "[yellow]N/A[/]"
-            else:
-                status = "[red]✗[/]"
-                mismatches.append(t)
-            result_table.add_row(t, f"{sqlite_count:,}", f"{pg_count:,}", status)
+    def start_table(self, table: str, total_rows: int):
+        pass
 
-        console.print(result_table)
+    def advance(self, table: str, rows: int, nbytes: int):
+        pass
 
-        if mismatches:
-            console.print(f"[red]Mismatches found in:[/] {', '.join(mismatches)}")
-        else:
-            console.print("[green]All tables match![/]")
-        return
+    def finish_table(self, table: str):
+        pass
 
-    console.print(
-        Panel(
-            f"SQLite to PostgreSQL Migration "
-            f"{'(DRY-RUN)' if DRY_RUN else ''}",
-            style="cyan",
-        )
+
+def make_progress_reporter(
+    mode: str,
+    row_counts: Dict[str, int],
+    interval: float = 10.0,
+    throttle: Optional[Throttle] = None,
+):
+    """Create a progress reporter for `--progress` mode."""
+    total_rows = sum(c for c in row_counts.values() if c > 0)
+    if mode == "auto":
+        mode = "bar" if console.is_terminal else "log"
+    if mode == "bar":
+        return RichProgressReporter(total_rows, len(row_counts), throttle)
+    if mode == "log":
+        return LogProgressReporter(total_rows, len(row_counts), interval, throttle=throttle)
+    return NullProgressReporter()
+
+
+def table_rows(
+    sqlite_conn: sqlite3.Connection,
+    table: str,
+    columns: List[str],
+    pg_types: Dict[str, str],
+    rewrites: Optional[Counter] = None,
+    max_lengths: Optional[Dict[str, int]] = None,
+    table_filter: Optional[TableFilter] = None,
+    compact_json: Optional[Counter] = None,
+) -> Iterable[tuple]:
+    """Normalized rows of a SQLite table, ready for COPY."""
+    return (
+        normalize_row(row, columns, pg_types, table, rewrites, max_lengths, compact_json)
+        for row in stream_sqlite_rows(sqlite_conn, table, columns, table_filter)
     )
 
-    console.print("[cyan]Creating temporary SQLite copy...[/]")
-    sqlite_copy_path = copy_sqlite_db(SQLITE_PATH)
-    console.print(f"[green]Using SQLite copy:[/] {sqlite_copy_path}")
 
-    validate_sqlite(sqlite_copy_path)
-    validate_postgres(MIGRATE_DATABASE_URL)
+def format_bytes(nbytes: float) -> str:
+    """Human readable size."""
+    for unit in ("B", "kB", "MB", "GB"):
+        if abs(nbytes) < 1000:
+            return f"{nbytes:.1f} {unit}"
+        nbytes /= 1000
+    return f"{nbytes:.1f} TB"
 
-    sqlite_conn = sqlite3.connect(sqlite_copy_path, timeout=60)
-    sqlite_conn.isolation_level = None
-    sqlite_conn.text_factory = lambda b: b.decode("utf-8", errors="replace")
 
-    pg_conn = psycopg2.connect(MIGRATE_DATABASE_URL)
+# Heap tuple header (23 bytes, aligned to 24) plus a 4 byte line pointer.
+PG_ROW_OVERHEAD_BYTES = 28
 
-    if DRY_RUN:
-        with pg_conn.cursor() as cur:
-            cur.execute("SET default_transaction_read_only = on")
-        console.print("[yellow]DRY-RUN: PostgreSQL session is read-only[/]")
-    else:
-        with pg_conn.cursor() as cur:
-            cur.execute("SET session_replication_role = replica")
-        pg_conn.commit()
 
-    tables = sqlite_tables(sqlite_conn)
+@dataclass
+class TableMeasurement:
+    """What `--dry-run=measure` found for one table."""
 
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-    ) as progress:
-        task = progress.add_task("Processing tables...", total=len(tables))
-        for table in tables:
-            migrate_table(sqlite_conn, pg_conn, table)
-            progress.advance(task)
+    table: str
+    rows: int
+    sampled_rows: int = 0
+    copy_bytes: int = 0
+    seconds: float = 0.0
+    rewrites: Counter = field(default_factory=Counter)
+    json_saved: Counter = field(default_factory=Counter)
 
-    sqlite_conn.close()
-    shutil.rmtree(sqlite_copy_path.parent, ignore_errors=True)
+    @property
+    def scale(self) -> float:
+        """Factor from the sample to the whole table."""
+        return self.rows / self.sampled_rows if self.sampled_rows else 0.0
 
-    if not DRY_RUN:
-        with pg_conn.cursor() as cur:
-            cur.execute("SET session_replication_role = origin")
-        pg_conn.commit()
+    @property
+    def predicted_copy_bytes(self) -> float:
+        return self.copy_bytes * self.scale
+
+    @property
+    def predicted_seconds(self) -> float:
+        return self.seconds * self.scale
+
+    @property
+    def predicted_pg_bytes(self) -> float:
+        """Rough heap size in Postgres, without indexes and TOAST compression."""
+        return self.predicted_copy_bytes + self.rows * PG_ROW_OVERHEAD_BYTES
 
-    pg_conn.close()
 
-    console.print(Panel("Done", style="green"))
+def measure_table(
+    sqlite_conn: sqlite3.Connection,
+    pg_conn,
+    table: str,
+    sqlite_count: int,
+    sample_rows: Optional[int] = None,
+    progress=None,
+    max_lengths: Optional[Dict[str, int]] = None,
+    table_filter: Optional[TableFilter] = None,
+    compact_json: bool = False,
+    pg_schema: str = "public",
+) -> TableMeasurement:
+    """Run the read, normalize and encode pipeline of a table into a null sink."""
+    if progress is None:
+        progress = NullProgressReporter()
+    if table_filter is None:
+        table_filter = TableFilter()
+    measurement = TableMeasurement(table, sqlite_count)
+    start_time = time.perf_counter()
+
+    columns = table_filter.columns(sqlite_schema(sqlite_conn, table))
+    pg_types = pg_column_types(pg_conn, table, pg_schema)
+    row_iter = table_rows(
+        sqlite_conn, table, columns, pg_types, measurement.rewrites, max_lengths,
+        table_filter, measurement.json_saved if compact_json else None,
+    )
+    if sample_rows is not None:
+        row_iter = islice(row_iter, sample_rows)
+
+    def on_progress(rows, nbytes):
+        measurement.sampled_rows += rows
+        progress.advance(table, rows, nbytes)
+
+    progress.start_table(table, min(sqlite_count, sample_rows or sqlite_count))
+    stream = CopyStream(row_iter, on_progress=on_progress)
+    while True:
+        chunk = stream.read(65536)
+        if not chunk:
+            break
+        measurement.copy_bytes += len(chunk.encode("utf-8"))
+    progress.finish_table(table)
+
+    measurement.seconds = time.perf_counter() - start_time
+    return measurement
+
+
+def print_measurements(measurements: List[TableMeasurement]) -> None:
+    """Print the `--dry-run=measure` report."""
+    from rich.table import Table  # pylint: disable=import-outside-toplevel
+
+    table = Table(title="Dry-run measurement")
+    table.add_column("Table", style="cyan")
+    table.add_column("Rows", justify="right", style="green")
+    table.add_column("Sampled", justify="right")
+    table.add_column("COPY size", justify="right")
+    table.add_column("Est. PG size", justify="right")
+    table.add_column("Est. time", justify="right")
+    table.add_column("Rewritten", justify="right", style="yellow")
+    for m in measurements:
+        table.add_row(
+            m.table,
+            f"{m.rows:,}",
+            f"{m.sampled_rows:,}",
+            format_bytes(m.predicted_copy_bytes),
+            format_bytes(m.predicted_pg_bytes),
+            f"{m.predicted_seconds:.1f}s",
+            f"{round(sum(m.rewrites.values()) * m.scale):,}",
+        )
+    table.add_row(
+        "[bold]Total[/]",
+        f"[bold]{sum(m.rows for m in measurements):,}[/]",
+        f"{sum(m.sampled_rows for m in measurements):,}",
+        format_bytes(sum(m.predicted_copy_bytes for m in measurements)),
+        format_bytes(sum(m.predicted_pg_bytes for m in measurements)),
+        f"[bold]{sum(m.predicted_seconds for m in measurements):.1f}s[/]",
+        f"{round(sum(sum(m.rewrites.values()) * m.scale for m in measurements)):,}",
+    )
+    console.print(table)
+
+    for m in measurements:
+        for (column, reason), count in sorted(m.rewrites.items()):
+            console.print(
+                f"[yellow]{m.table}.{column}:[/] ~{round(count * m.scale):,} "
+                f"values rewritten ({reason})"
+            )
+        for column, saved in sorted(m.json_saved.items()):
+            console.print(
+                f"[green]{m.table}.{column}:[/] ~{format_bytes(saved * m.scale)} "
+                f"saved by JSON compaction"
+            )
+    console.print(
+        "[dim]Times are for reading and encoding on this host; PG size is heap only, "
+        "without indexes and TOAST compression.[/]"
+    )
+
+
+def iter_chunks(iterable: Iterable, size: int) -> Iterable[Iterable]:
+    """Split an iterable into lazy chunks of at most `size` items.
+
+    Each chunk must be consumed before the next one is taken.
+    """
+    iterator = iter(iterable)
+    for first in iterator:
+        yield chain([first], islice(iterator, size - 1))
+
+
+def chunked(iterable: Iterable, size: int) -> Iterable[list]:
+    """Split an iterable into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class RejectWriter:
+    """Rows rejected by PostgreSQL, appended to a JSONL file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, table: str, pk: dict, error: str) -> None:
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(
+                json.dumps({"table": table, "pk": pk, "error": error}, default=str) + "\n"
+            )
+            self._file.flush()
+            self.count += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class CommitStats:
+    """Number and latency of commits.
+
+    `on_commit(seconds)` is called with the latency of every commit.
+    """
+
+    def __init__(self, on_commit: Optional[Callable[[float], None]] = None):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.on_commit = on_commit
+        self._lock = threading.Lock()
+
+    def commit(self, pg_conn) -> None:
+        """Commit `pg_conn` and record how long it took."""
+        start_time = time.perf_counter()
+        pg_conn.commit()
+        elapsed = time.perf_counter() - start_time
+        with self._lock:
+            self.count += 1
+            self.total += elapsed
+            self.max = max(self.max, elapsed)
+        if self.on_commit is not None:
+            self.on_commit(elapsed)
+
+    def summary(self) -> str:
+        mean = self.total / self.count if self.count else 0.0
+        return (
+            f"{self.count} commits, {self.total:.2f}s total, "
+            f"mean {mean * 1000:.1f}ms, max {self.max * 1000:.1f}ms"
+        )
+
+
+def row_errors() -> tuple:
+    """COPY errors caused by the data of a row, which bisection can isolate."""
+    return (psycopg2.DataError, psycopg2.IntegrityError)
+
+
+def copy_chunk(
+    pg_conn,
+    table: str,
+    columns: List[str],
+    rows: List[tuple],
+    pk_columns: List[str],
+    rejects: RejectWriter,
+    label: Optional[str] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    throttle: Optional[Throttle] = None,
+) -> int:
+    """COPY a chunk of rows under a savepoint, bisecting on row errors.
+
+    A failing chunk is split in half until the failing rows are single
+    rows; those go to `rejects` and everything else is loaded.
+    Returns the number of rows loaded.
+    """
+    with pg_conn.cursor() as cur:
+        cur.execute("SAVEPOINT migrate_chunk")
+        try:
+            cur.copy_expert(
+                copy_sql(table, columns), CopyStream(iter(rows), on_progress, throttle)
+            )
+        except row_errors() as e:
+            cur.execute("ROLLBACK TO SAVEPOINT migrate_chunk")
+            # Release before bisecting, so savepoints do not nest past the
+            # subtransaction cache of the backend.
+            cur.execute("RELEASE SAVEPOINT migrate_chunk")
+            if len(rows) == 1:
+                pk_values = {c: rows[0][columns.index(c)] for c in pk_columns}
+                rejects.write(label or table, pk_values, str(e).strip())
+                return 0
+            middle = len(rows) // 2
+            return sum(
+                copy_chunk(
+                    pg_conn, table, columns, part, pk_columns, rejects, label,
+                    throttle=throttle,
+                )
+                for part in (rows[:middle], rows[middle:])
+            )
+        cur.execute("RELEASE SAVEPOINT migrate_chunk")
+    return len(rows)
+
+
+def pg_primary_key(conn, table: str, schema: str = "public") -> List[str]:
+    """Primary key columns of a Postgres table, in key order."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT a.attname
+            FROM pg_index i
+            JOIN pg_attribute a
+              ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+            WHERE i.indrelid = %s::regclass
+              AND i.indisprimary
+            ORDER BY array_position(i.indkey::int2[], a.attnum)
+        """, (f"{schema}.{pg_ident(table)}",))
+        return [r[0] for r in cur.fetchall()]
+
+
+def pg_correlation(
+    conn, table: str, columns: List[str], schema: str = "public"
+) -> Dict[str, Optional[float]]:
+    """ANALYZE a table and return `pg_stats.correlation` of `columns`.
+
+    Near 1 or -1, rows are stored in column order and index range scans
+    read few pages. It is None for a column with fewer than two non-null
+    values.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"ANALYZE {pg_ident(table)}")
+        cur.execute("""
+            SELECT attname, correlation
+            FROM pg_stats
+            WHERE schemaname = %s
+              AND tablename = %s
+              AND attname = ANY(%s)
+        """, (schema, table, list(columns)))
+        return dict(cur.fetchall())
+
+
+STAGE_PREFIX = "_migrate_stage_"
+STAGE_SEQ_COLUMN = "_migrate_seq"
+
+
+def create_staging_table(pg_conn, table: str) -> str:
+    """Create an empty unlogged staging table shaped like `table`, and return its name.
+
+    Defaults are not copied, so COPY into it can not advance the target's sequences.
+    `_migrate_seq` numbers the staged rows for batching.
+    """
+    stage = STAGE_PREFIX + table
+    with pg_conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {stage}")
+        cur.execute(f"CREATE UNLOGGED TABLE {stage} (LIKE {pg_ident(table)})")
+        cur.execute(f"ALTER TABLE {stage} ADD COLUMN {STAGE_SEQ_COLUMN} bigserial")
+    return stage
+
+
+@dataclass
+class MergeResult:
+    """Row counts from merging a staging table into its target."""
+
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+
+def merge_staging_table(
+    pg_conn,
+    table: str,
+    stage: str,
+    columns: List[str],
+    pk_columns: List[str],
+    batch_rows: int = 100_000,
+    after_batch: Optional[Callable[[], None]] = None,
+) -> MergeResult:
+    """Upsert staged rows into `table`, `batch_rows` at a time, and drop the stage.
+
+    Batches are ranges of `_migrate_seq`. Rows whose values already match
+    are left alone and counted as unchanged. `after_batch` is called after
+    each batch, for example to commit.
+    """
+    col_sql = ", ".join(columns)
+    others = [c for c in columns if c not in pk_columns]
+    if others:
+        conflict = (
+            "DO UPDATE SET "
+            + ", ".join(f"{c} = EXCLUDED.{c}" for c in others)
+            + f" WHERE ROW({', '.join(f't.{c}' for c in others)})::text"
+            + f" IS DISTINCT FROM ROW({', '.join(f'EXCLUDED.{c}' for c in others)})::text"
+        )
+    else:
+        conflict = "DO NOTHING"
+
+    result = MergeResult()
+    with pg_conn.cursor() as cur:
+        cur.execute(f"SELECT COALESCE(MAX({STAGE_SEQ_COLUMN}), 0) FROM {stage}")
+        last = cur.fetchone()[0]
+        for start in range(0, last, batch_rows):
+            end = min(start + batch_rows, last)
+            # Failed COPY attempts under --reject-file leave gaps in the
+            # sequence, so staged rows are counted instead of taken from the range.
+            cur.execute(f"""
+                WITH staged AS (
+                    SELECT {col_sql} FROM {stage}
+                    WHERE {STAGE_SEQ_COLUMN} > %s AND {STAGE_SEQ_COLUMN} <= %s
+                ), merged AS (
+                    INSERT INTO {pg_ident(table)} AS t ({col_sql})
+                    SELECT {col_sql} FROM staged
+                    ON CONFLICT ({', '.join(pk_columns)}) {conflict}
+                    RETURNING (xmax = 0) AS inserted
+                )
+                SELECT (SELECT COUNT(*) FROM staged),
+                       COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+                FROM merged
+            """, (start, end))
+            staged, inserted, updated = cur.fetchone()
+            result.inserted += inserted
+            result.updated += updated
+            result.unchanged += staged - inserted - updated
+            if after_batch is not None:
+                after_batch()
+        cur.execute(f"DROP TABLE {stage}")
+    return result
+
+
+def print_value_changes(
+    label: str, rewrites: Counter, json_saved: Optional[Counter] = None
+) -> None:
+    """Print values changed per column and reason, and bytes saved by JSON compaction."""
+    for (column, reason), count in sorted(rewrites.items()):
+        console.print(f"[yellow]{label}.{column}:[/] {count:,} values changed ({reason})")
+    for column, saved in sorted((json_saved or {}).items()):
+        console.print(
+            f"[green]{label}.{column}:[/] {format_bytes(saved)} saved by JSON compaction"
+        )
+
+
+def migrate_table(
+    sqlite_conn: sqlite3.Connection,
+    pg_conn,
+    table: str,
+    progress=None,
+    sqlite_count: Optional[int] = None,
+    pg_schema: str = "public",
+    label: Optional[str] = None,
+    rejects: Optional[RejectWriter] = None,
+    chunk_rows: int = 100_000,
+    transaction: str = "per-table",
+    commit_stats: Optional[CommitStats] = None,
+    load_mode: str = "truncate",
+    pg_types: Optional[Dict[str, str]] = None,
+    truncate: bool = True,
+    max_lengths: Optional[Dict[str, int]] = None,
+    dry_run: Union[bool, str] = False,
+    table_filter: Optional[TableFilter] = None,
+    compact_json: bool = False,
+    throttle: Optional[Throttle] = None,
+) -> Optional[MergeResult]:
+    """Migrate a table.
+
+    `progress` is a progress reporter (see `make_progress_reporter`), and
+    `sqlite_count` skips the row count query when it is already known.
+    Unqualified table names resolve through the connection's search_path,
+    which must lead to `pg_schema`. `label` names the table in output.
+    With `rejects`, rows are copied in chunks of `chunk_rows` and rows
+    PostgreSQL rejects are written there instead of failing the table.
+
+    `transaction` is one of `TRANSACTION_POLICIES`. With `per-table` the
+    TRUNCATE and COPY are committed together at the end, with `per-chunk`
+    every `chunk_rows` rows, and with `atomic` not at all, which is left
+    to the caller. On errors, `per-table` and `per-chunk` roll back the
+    open transaction before raising.
+
+    With `load_mode="merge"`, rows are copied into a staging table and
+    upserted by primary key instead of truncating the table, and the
+    inserted, updated and unchanged counts are returned. Tables without a
+    primary key are truncated and loaded as usual.
+
+    `pg_types` skips the catalog query when the column types are already
+    known, and `truncate=False` leaves truncating to the caller.
+    `max_lengths` maps `character varying(n)` columns to `n`; longer
+    values are cut. Values changed on the way are counted per column.
+    With `dry_run`, nothing is read or written. `table_filter` limits the
+    rows and columns that are copied. With `compact_json`, jsonb values are
+    copied without whitespace and the bytes saved are printed per column.
+    `throttle` limits the COPY rate.
+    """
+    if commit_stats is None:
+        commit_stats = CommitStats()
+    start_time = time.time()
+    label = label or table
+    if sqlite_count is None:
+        sqlite_count = sqlite_conn.execute(
+            f'SELECT COUNT(*) FROM "{table}"'
+        ).fetchone()[0]
+
+    console.print(
+        f"[cyan]Table:[/] {label} "
+        f"[dim](rows: {sqlite_count})[/]"
+    )
+
+    if progress is None:
+        progress = NullProgressReporter()
+
+    if dry_run:
+        console.print(f"[yellow]DRY-RUN: for {label}[/]")
+        progress.start_table(label, 0)
+        progress.finish_table(label)
+        return None
+
+    if table_filter is None:
+        table_filter = TableFilter()
+    schema = sqlite_schema(sqlite_conn, table)
+    columns = table_filter.columns(schema)
+    if pg_types is None:
+        pg_types = pg_column_types(pg_conn, table, pg_schema)
+    rewrites = Counter()
+    json_saved = Counter() if compact_json else None
+    row_iter = table_rows(
+        sqlite_conn, table, columns, pg_types, rewrites, max_lengths, table_filter,
+        json_saved,
+    )
+    if table_filter.order_by:
+        if sqlite_sorts(sqlite_conn, table_filter.select_sql(table, columns)):
+            console.print(
+                f"[yellow]{label}: no SQLite index matches ORDER BY "
+                f"{table_filter.order_by}, SQLite sorts the table first[/]"
+            )
+        else:
+            console.print(
+                f"[dim]{label}: reading in index order ({table_filter.order_by})[/]"
+            )
+
+    merge_pk = []
+    if load_mode == "merge":
+        merge_pk = pg_primary_key(pg_conn, table, pg_schema)
+        if not merge_pk:
+            console.print(f"[yellow]{label} has no primary key, truncating instead of merging[/]")
+
+    progress.start_table(label, sqlite_count)
+
+    def on_progress(rows, nbytes):
+        progress.advance(label, rows, nbytes)
+
+    merge_result = None
+    try:
+        if merge_pk:
+            target = create_staging_table(pg_conn, table)
+        else:
+            target = table
+            if truncate:
+                with pg_conn.cursor() as cur:
+                    cur.execute(f"TRUNCATE TABLE {pg_ident(table)} CASCADE")
+        uncommitted = True
+
+        if rejects is None and transaction != "per-chunk":
+            with pg_conn.cursor() as cur:
+                cur.copy_expert(
+                    copy_sql(target, columns), CopyStream(row_iter, on_progress, throttle)
+                )
+        elif rejects is None:
+            for chunk in iter_chunks(row_iter, chunk_rows):
+                with pg_conn.cursor() as cur:
+                    cur.copy_expert(
+                        copy_sql(target, columns), CopyStream(chunk, on_progress, throttle)
+                    )
+                commit_stats.commit(pg_conn)
+                uncommitted = False
+        else:
+            pk_columns = [
+                c[1] for c in sorted(schema, key=lambda c: c[5]) if c[5] and c[1] in columns
+            ] or columns
+            rejected = 0
+            for chunk in chunked(row_iter, chunk_rows):
+                rejected += len(chunk) - copy_chunk(
+                    pg_conn, target, columns, chunk, pk_columns, rejects, label, on_progress,
+                    throttle,
+                )
+                if transaction == "per-chunk":
+                    commit_stats.commit(pg_conn)
+                    uncommitted = False
+            if rejected:
+                console.print(
+                    f"[yellow]Rejected {rejected} rows of {label}, see {rejects.path}[/]"
+                )
+
+        if merge_pk:
+            merge_result = merge_staging_table(
+                pg_conn, table, target, columns, merge_pk, chunk_rows,
+                after_batch=(lambda: commit_stats.commit(pg_conn))
+                if transaction == "per-chunk" else None,
+            )
+            uncommitted = True
+
+        if transaction != "atomic" and uncommitted:
+            commit_stats.commit(pg_conn)
+    except Exception:
+        if transaction != "atomic":
+            pg_conn.rollback()
+        raise
+    if table_filter.order_by and not merge_pk:
+        correlation = pg_correlation(
+            pg_conn, table, order_columns(table_filter.order_by), pg_schema
+        )
+        console.print(f"[dim]{label} correlation: " + ", ".join(
+            f"{column} {'n/a' if value is None else f'{value:.2f}'}"
+            for column, value in correlation.items()
+        ) + "[/]")
+    progress.finish_table(label)
+    print_value_changes(label, rewrites, json_saved)
+    if merge_result is not None:
+        console.print(
+            f"[green]Merged {label}:[/] {merge_result.inserted:,} inserted, "
+            f"{merge_result.updated:,} updated, {merge_result.unchanged:,} unchanged"
+        )
+    elapsed = time.time() - start_time
+    console.print(f"[green]Migrated {label} in {elapsed:.2f}s[/]")
+    return merge_result
+
+def group_small_tables(
+    tables: List[str], row_counts: Dict[str, int], max_rows: int
+) -> List[List[str]]:
+    """Split tables, in order, into runs of small tables and single large tables.
+
+    Keeping the order means a group's TRUNCATE ... CASCADE can only reach
+    tables that are loaded after it, as with one table at a time.
+    """
+    groups = []
+    previous_small = False
+    for table in tables:
+        small = 0 <= row_counts.get(table, -1) <= max_rows
+        if small and previous_small:
+            groups[-1].append(table)
+        else:
+            groups.append([table])
+        previous_small = small
+    return groups
+
+
+def migrate_table_group(
+    sqlite_conn: sqlite3.Connection,
+    pg_conn,
+    tables: List[str],
+    row_counts: Dict[str, int],
+    pg_types: Dict[str, Dict[str, str]],
+    transaction: str = "per-table",
+    commit_stats: Optional[CommitStats] = None,
+    label_prefix: str = "",
+    max_lengths: Optional[Dict[str, Dict[str, int]]] = None,
+    filters: Optional[Dict[str, TableFilter]] = None,
+    **kwargs,
+) -> None:
+    """Migrate small tables with one TRUNCATE and, unless atomic, one commit.
+
+    Other keyword arguments are passed on to `migrate_table`.
+    """
+    if commit_stats is None:
+        commit_stats = CommitStats()
+    try:
+        truncate_tables(pg_conn, tables, commit=False)
+        for table in tables:
+            migrate_table(
+                sqlite_conn, pg_conn, table,
+                sqlite_count=row_counts[table],
+                label=f"{label_prefix}{table}",
+                pg_types=pg_types[table],
+                max_lengths=(max_lengths or {}).get(table),
+                table_filter=(filters or {}).get(table),
+                truncate=False,
+                transaction="atomic",
+                **kwargs,
+            )
+        if transaction != "atomic":
+            commit_stats.commit(pg_conn)
+    except Exception:
+        if transaction != "atomic":
+            pg_conn.rollback()
+        raise
+
+
+def migrate_tables(
+    sqlite_conn: sqlite3.Connection,
+    pg_conn,
+    tables: List[str],
+    row_counts: Dict[str, int],
+    pg_schema: str = "public",
+    label_prefix: str = "",
+    transaction: str = "per-table",
+    commit_stats: Optional[CommitStats] = None,
+    load_mode: str = "truncate",
+    small_table_rows: int = SMALL_TABLE_ROWS,
+    dry_run: Union[bool, str] = False,
+    filters: Optional[Dict[str, TableFilter]] = None,
+    **kwargs,
+) -> MergeResult:
+    """Migrate tables in order, with the column types and lengths of all tables fetched at once.
+
+    Runs of tables with at most `small_table_rows` rows share one TRUNCATE
+    and one commit. `filters` maps tables to their `TableFilter`.
+    Other keyword arguments are passed on to `migrate_table`.
+    Returns the merge totals for `load_mode="merge"`.
+    """
+    if commit_stats is None:
+        commit_stats = CommitStats()
+    merged = MergeResult()
+    pg_types = pg_column_types_bulk(pg_conn, tables, pg_schema)
+    max_lengths = pg_column_lengths_bulk(pg_conn, tables, pg_schema)
+    if dry_run or load_mode != "truncate" or small_table_rows <= 0:
+        groups = [[t] for t in tables]
+    else:
+        groups = group_small_tables(tables, row_counts, small_table_rows)
+
+    for group in groups:
+        if len(group) > 1:
+            migrate_table_group(
+                sqlite_conn, pg_conn, group, row_counts, pg_types,
+                transaction=transaction,
+                commit_stats=commit_stats,
+                label_prefix=label_prefix,
+                pg_schema=pg_schema,
+                max_lengths=max_lengths,
+                filters=filters,
+                **kwargs,
+            )
+            continue
+        table = group[0]
+        merge_result = migrate_table(
+            sqlite_conn, pg_conn, table,
+            sqlite_count=row_counts[table] if row_counts[table] >= 0 else None,
+            pg_schema=pg_schema,
+            label=f"{label_prefix}{table}",
+            transaction=transaction,
+            commit_stats=commit_stats,
+            load_mode=load_mode,
+            pg_types=pg_types[table],
+            max_lengths=max_lengths[table],
+            dry_run=dry_run,
+            table_filter=(filters or {}).get(table),
+            **kwargs,
+        )
+        if merge_result is not None:
+            merged.inserted += merge_result.inserted
+            merged.updated += merge_result.updated
+            merged.unchanged += merge_result.unchanged
+    return merged
+
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def copy_sql(table: str, columns: List[str]) -> str:
+    """COPY statement matching the CSV written by CopyStream."""
+    return (
+        f"COPY {pg_ident(table)} ({', '.join(columns)}) "
+        f"FROM STDIN WITH CSV NULL '{COPY_NULL_MARKER}'"
+    )
+
+
+def truncate_tables(pg_conn, tables: List[str], commit: bool = True) -> None:
+    """Truncate all tables in one statement, so CASCADE cannot hit data loaded later."""
+    if not tables:
+        return
+    with pg_conn.cursor() as cur:
+        cur.execute(
+            f"TRUNCATE TABLE {', '.join(pg_ident(t) for t in tables)} CASCADE"
+        )
+    if commit:
+        pg_conn.commit()
+
+
+def file_sha256(path: Path) -> str:
+    """Hex SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_table(
+    sqlite_conn: sqlite3.Connection,
+    table: str,
+    out_dir: Path,
+    chunk_rows: int,
+    progress=None,
+    table_filter: Optional[TableFilter] = None,
+    compact_json: bool = False,
+) -> dict:
+    """Write a table as gzipped COPY CSV files of at most `chunk_rows` rows.
+
+    Returns the manifest entry for the table.
+    """
+    if progress is None:
+        progress = NullProgressReporter()
+    if table_filter is None:
+        table_filter = TableFilter()
+    columns = table_filter.columns(sqlite_schema(sqlite_conn, table))
+    pg_types = sqlite_column_types(sqlite_conn, table)
+    rows = iter(table_rows(
+        sqlite_conn, table, columns, pg_types, table_filter=table_filter,
+        compact_json=Counter() if compact_json else None,
+    ))
+    entry = {"name": table, "columns": columns, "rows": 0, "chunks": []}
+
+    def chunk_progress(chunk):
+        def on_progress(n, nbytes):
+            chunk["rows"] += n
+            progress.advance(table, n, nbytes)
+        return on_progress
+
+    while True:
+        first = next(rows, None)
+        if first is None:
+            break
+        path = out_dir / f"{table}.{len(entry['chunks']):05d}.csv.gz"
+        chunk = {"file": path.name, "rows": 0}
+        stream = CopyStream(
+            chain([first], islice(rows, chunk_rows - 1)), chunk_progress(chunk)
+        )
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=1, newline="") as f:
+            for data in iter(lambda: stream.read(1 << 16), ""):
+                f.write(data)
+        chunk["bytes"] = path.stat().st_size
+        chunk["sha256"] = file_sha256(path)
+        entry["chunks"].append(chunk)
+        entry["rows"] += chunk["rows"]
+    return entry
+
+
+def extract_tables(
+    sqlite_conn: sqlite3.Connection,
+    out_dir: Path,
+    chunk_rows: int,
+    progress=None,
+    row_counts: Optional[Dict[str, int]] = None,
+    tables: Optional[List[str]] = None,
+    filters: Optional[Dict[str, TableFilter]] = None,
+    compact_json: bool = False,
+) -> dict:
+    """Extract `tables`, by default all, to `out_dir` and write the manifest."""
+    if progress is None:
+        progress = NullProgressReporter()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "tool_version": __version__,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "format": "csv",
+        "compression": "gzip",
+        "null": COPY_NULL_MARKER,
+        "tables": [],
+    }
+    if tables is None:
+        tables = sqlite_tables(sqlite_conn)
+    for table in tables:
+        progress.start_table(table, (row_counts or {}).get(table, 0))
+        manifest["tables"].append(extract_table(
+            sqlite_conn, table, out_dir, chunk_rows, progress, (filters or {}).get(table),
+            compact_json,
+        ))
+        progress.finish_table(table)
+    (out_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+def read_manifest(directory: Path) -> dict:
+    """Read and check a manifest written by `extract_tables`."""
+    manifest = json.loads((directory / MANIFEST_NAME).read_text(encoding="utf-8"))
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise RuntimeError(
+            f"Unsupported manifest version in {directory}: {manifest.get('version')}"
+        )
+    return manifest
+
+
+class ThrottledFile:
+    """File-like object that waits for a `Throttle` on every `read()`.
+
+    `fileobj` returns bytes, the uncompressed COPY data, so the throttle
+    counts what is sent to Postgres.
+    """
+
+    def __init__(self, fileobj, throttle: Throttle):
+        self.fileobj = fileobj
+        self.throttle = throttle
+
+    def read(self, size=8192):
+        data = self.fileobj.read(size)
+        if data:
+            self.throttle.wait(len(data))
+        return data
+
+
+def load_chunk(
+    pg_conn,
+    directory: Path,
+    entry: dict,
+    chunk: dict,
+    throttle: Optional[Throttle] = None,
+    commit_stats: Optional[CommitStats] = None,
+) -> None:
+    """Verify and COPY one extracted file, in its own transaction."""
+    data = (directory / chunk["file"]).read_bytes()
+    if hashlib.sha256(data).hexdigest() != chunk["sha256"]:
+        raise RuntimeError(f"Checksum mismatch for {chunk['file']}")
+    if commit_stats is None:
+        commit_stats = CommitStats()
+    stream = gzip.GzipFile(fileobj=BytesIO(data))
+    if throttle is not None:
+        stream = ThrottledFile(stream, throttle)
+    try:
+        with pg_conn.cursor() as cur:
+            cur.copy_expert(copy_sql(entry["name"], entry["columns"]), stream)
+        commit_stats.commit(pg_conn)
+    except Exception:
+        pg_conn.rollback()
+        raise
+
+
+def shard_chunks(entries: List[dict], shard: Tuple[int, int] = (1, 1)) -> Dict[str, List[dict]]:
+    """Chunks of each manifest entry that shard `K/N` loads.
+
+    Files are numbered across all tables in manifest order, and shard K
+    takes every N-th one starting at the K-th, so large tables are spread
+    over all shards.
+    """
+    index, count = shard
+    numbered = [(e["name"], c) for e in entries for c in e["chunks"]]
+    chunks = {e["name"]: [] for e in entries}
+    for i, (table, chunk) in enumerate(numbered):
+        if i % count == index - 1:
+            chunks[table].append(chunk)
+    return chunks
+
+
+def load_directory(
+    db_url: str,
+    directory: Path,
+    jobs: int = 4,
+    progress=None,
+    throttle: Optional[Throttle] = None,
+    commit_stats: Optional[CommitStats] = None,
+    tables: Optional[List[str]] = None,
+    shard: Tuple[int, int] = (1, 1),
+    truncate: bool = True,
+) -> dict:
+    """Load an extracted directory into Postgres, `jobs` files at a time.
+
+    Only `tables` are loaded when given, and only the files of `shard`
+    (see `shard_chunks()`). With `truncate`, the tables are truncated
+    first; each file is then committed on its own and recorded in
+    `commit_stats`. `throttle` limits the rate of all jobs together.
+    Returns loaded rows per table.
+    """
+    if progress is None:
+        progress = NullProgressReporter()
+    manifest = read_manifest(directory)
+    entries = [e for e in manifest["tables"] if tables is None or e["name"] in tables]
+    chunks = shard_chunks(entries, shard)
+
+    from psycopg2.pool import ThreadedConnectionPool  # pylint: disable=import-outside-toplevel
+
+    pool = ThreadedConnectionPool(1, jobs, db_url)
+    try:
+        if truncate:
+            pg_conn = pool.getconn()
+            truncate_tables(pg_conn, [e["name"] for e in entries])
+            pool.putconn(pg_conn)
+
+        lock = threading.Lock()
+        remaining = {e["name"]: len(chunks[e["name"]]) for e in entries}
+        loaded = {e["name"]: 0 for e in entries}
+        for entry in entries:
+            progress.start_table(
+                entry["name"], sum(c["rows"] for c in chunks[entry["name"]])
+            )
+            if not chunks[entry["name"]]:
+                progress.finish_table(entry["name"])
+
+        def work(entry, chunk):
+            pg_conn = pool.getconn()
+            try:
+                with pg_conn.cursor() as cur:
+                    cur.execute("SET session_replication_role = replica")
+                load_chunk(pg_conn, directory, entry, chunk, throttle, commit_stats)
+            finally:
+                pool.putconn(pg_conn)
+            table = entry["name"]
+            progress.advance(table, chunk["rows"], chunk["bytes"])
+            with lock:
+                loaded[table] += chunk["rows"]
+                remaining[table] -= 1
+                if not remaining[table]:
+                    progress.finish_table(table)
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(work, entry, chunk)
+                for entry in entries
+                for chunk in chunks[entry["name"]]
+            ]
+            for future in futures:
+                future.result()
+    finally:
+        pool.closeall()
+    return loaded
+
+
+@dataclass
+class TableFinalization:
+    """Sequences set, statistics gathered and time spent after loading one table."""
+
+    table: str
+    sequences: Dict[str, int] = field(default_factory=dict)
+    vacuumed: bool = False
+    seconds: float = 0.0
+
+
+def pg_owned_sequences(
+    conn, tables: List[str], schema: str = "public"
+) -> Dict[str, List[Tuple[str, str]]]:
+    """Serial and identity sequences of tables, as `(column, sequence)` per table."""
+    sequences = {t: [] for t in tables}
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT t.relname, a.attname, s.oid::regclass::text
+            FROM pg_class s
+            JOIN pg_depend d ON d.objid = s.oid
+             AND d.classid = 'pg_class'::regclass
+             AND d.refclassid = 'pg_class'::regclass
+             AND d.deptype IN ('a', 'i')
+            JOIN pg_class t ON t.oid = d.refobjid
+            JOIN pg_namespace n ON n.oid = t.relnamespace
+            JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = d.refobjsubid
+            WHERE s.relkind = 'S'
+              AND n.nspname = %s
+              AND t.relname = ANY(%s)
+            ORDER BY t.relname, a.attnum
+        """, (schema, list(tables)))
+        for table, column, sequence in cur.fetchall():
+            sequences[table].append((column, sequence))
+    return sequences
+
+
+def finalize_table(
+    pg_conn, table: str, sequences: List[Tuple[str, str]], vacuum: bool = False
+) -> TableFinalization:
+    """Move sequences past the loaded ids, then ANALYZE or `VACUUM (FREEZE, ANALYZE)`.
+
+    `pg_conn` must be in autocommit mode, since VACUUM can not run in a
+    transaction. A sequence of an empty table restarts at its minimum.
+    """
+    start_time = time.perf_counter()
+    result = TableFinalization(table, vacuumed=vacuum)
+    with pg_conn.cursor() as cur:
+        for column, sequence in sequences:
+            cur.execute(f"""
+                SELECT setval(%s, GREATEST(
+                    (SELECT COALESCE(MAX({pg_ident(column)}) + 1, 1) FROM {pg_ident(table)}),
+                    (SELECT seqmin FROM pg_sequence WHERE seqrelid = %s::regclass)
+                ), false)
+            """, (sequence, sequence))
+            result.sequences[sequence] = cur.fetchone()[0]
+        if vacuum:
+            cur.execute(f"VACUUM (FREEZE, ANALYZE) {pg_ident(table)}")
+        else:
+            cur.execute(f"ANALYZE {pg_ident(table)}")
+    result.seconds = time.perf_counter() - start_time
+    return result
+
+
+def finalize_tables(
+    db_url: str,
+    tables: List[str],
+    row_counts: Dict[str, int],
+    pg_schema: str = "public",
+    jobs: int = 4,
+    vacuum_freeze_rows: Optional[int] = None,
+) -> List[TableFinalization]:
+    """Finalize loaded tables, `jobs` at a time on a connection pool.
+
+    Every owned sequence is set past the largest id, and each table is
+    analyzed, or vacuumed with FREEZE when it has at least
+    `vacuum_freeze_rows` rows. Results are in the order of `tables`.
+    """
+    if not tables:
+        return []
+
+    from psycopg2.pool import ThreadedConnectionPool  # pylint: disable=import-outside-toplevel
+
+    pool = ThreadedConnectionPool(1, jobs, db_url)
+    try:
+        pg_conn = pool.getconn()
+        sequences = pg_owned_sequences(pg_conn, tables, pg_schema)
+        pool.putconn(pg_conn)
+
+        def work(table):
+            pg_conn = pool.getconn()
+            try:
+                pg_conn.autocommit = True
+                with pg_conn.cursor() as cur:
+                    cur.execute(f"SET search_path TO {pg_schema}")
+                vacuum = (
+                    vacuum_freeze_rows is not None
+                    and row_counts.get(table, 0) >= vacuum_freeze_rows
+                )
+                return finalize_table(pg_conn, table, sequences[table], vacuum)
+            finally:
+                pool.putconn(pg_conn)
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(work, tables))
+    finally:
+        pool.closeall()
+
+
+ASYNC_FETCH_ROWS = 500
+
+
+def async_pool_class():
+    """psycopg 3 AsyncConnectionPool, imported only when the async engine is used."""
+    try:
+        from psycopg_pool import AsyncConnectionPool  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        raise RuntimeError(
+            "The async engine needs psycopg 3, install with: "
+            "pip install 'open-webui-sqlite-migration[async]'"
+        ) from e
+    return AsyncConnectionPool
+
+
+async def _pg_column_types_async(conn, table: str, schema: str) -> Dict[str, str]:
+    cur = await conn.execute("""
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = %s
+          AND table_name = %s
+    """, (schema, table))
+    return dict(await cur.fetchall())
+
+
+def _open_sqlite_reader(sqlite_path: Path, table: str, table_filter: TableFilter):
+    """SQLite rows of a table for the async engine, made in an executor thread."""
+    conn = open_sqlite_snapshot(sqlite_path)
+    columns = table_filter.columns(sqlite_schema(conn, table))
+    return conn, stream_sqlite_rows(conn, table, columns, table_filter), columns
+
+
+def _fetch_normalized(
+    row_iter, columns, pg_types, table, rewrites=None, max_lengths=None, compact_json=None
+):
+    """Next batch of rows for COPY write_row(), with rough text size in bytes."""
+    rows = []
+    nbytes = 0
+    for row in islice(row_iter, ASYNC_FETCH_ROWS):
+        out = tuple(
+            None if v == COPY_NULL_MARKER else v
+            for v in normalize_row(
+                row, columns, pg_types, table, rewrites, max_lengths, compact_json
+            )
+        )
+        nbytes += sum(len(v.encode("utf-8")) for v in out if isinstance(v, str))
+        rows.append(out)
+    return rows, nbytes
+
+
+async def _async_copy_table(
+    pool, executor, sqlite_path, table, pg_schema, progress, row_count, table_filter,
+    max_lengths, compact_json, throttle,
+):
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    loop = asyncio.get_running_loop()
+    rewrites = Counter()
+    json_saved = Counter() if compact_json else None
+    sqlite_conn, sqlite_rows, columns = await loop.run_in_executor(
+        executor, _open_sqlite_reader, sqlite_path, table, table_filter
+    )
+    try:
+        async with pool.connection() as conn:
+            pg_types = await _pg_column_types_async(conn, table, pg_schema)
+            progress.start_table(table, row_count)
+            cur = conn.cursor()
+            async with cur.copy(
+                f"COPY {pg_ident(table)} ({', '.join(columns)}) FROM STDIN"
+            ) as copy:
+                while True:
+                    rows, nbytes = await loop.run_in_executor(
+                        executor, _fetch_normalized, sqlite_rows, columns, pg_types, table,
+                        rewrites, max_lengths, json_saved,
+                    )
+                    if not rows:
+                        break
+                    for row in rows:
+                        await copy.write_row(row)
+                    progress.advance(table, len(rows), nbytes)
+                    if throttle is not None:
+                        await asyncio.sleep(throttle.reserve(nbytes))
+            await cur.close()
+        progress.finish_table(table)
+        print_value_changes(table, rewrites, json_saved)
+    finally:
+        await loop.run_in_executor(executor, sqlite_conn.close)
+
+
+async def _async_migrate(
+    db_url, sqlite_path, tables, row_counts, max_streams, progress, pg_schema, filters,
+    compact_json, throttle,
+):
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    async def configure(conn):
+        await conn.execute("SET session_replication_role = replica")
+        await conn.execute(f"SET search_path TO {pg_schema}")
+        await conn.commit()
+
+    pool = async_pool_class()(
+        db_url, min_size=1, max_size=max_streams, configure=configure, open=False
+    )
+    await pool.open()
+    try:
+        max_lengths = {t: {} for t in tables}
+        async with pool.connection() as conn:
+            await conn.execute(
+                f"TRUNCATE TABLE {', '.join(pg_ident(t) for t in tables)} CASCADE"
+            )
+            cur = await conn.execute(PG_COLUMN_LENGTHS_SQL, (pg_schema, list(tables)))
+            for table, column, length in await cur.fetchall():
+                max_lengths[table][column] = length
+
+        semaphore = asyncio.Semaphore(max_streams)
+        with ThreadPoolExecutor(max_workers=max_streams) as executor:
+            async def run(table):
+                async with semaphore:
+                    await _async_copy_table(
+                        pool, executor, sqlite_path, table, pg_schema,
+                        progress, max(row_counts.get(table, 0), 0),
+                        filters.get(table, TableFilter()), max_lengths[table],
+                        compact_json, throttle,
+                    )
+            await asyncio.gather(*(run(t) for t in tables))
+    finally:
+        await pool.close()
+
+
+def async_migrate(
+    db_url: str,
+    sqlite_path: Path,
+    tables: List[str],
+    row_counts: Dict[str, int],
+    max_streams: int = 4,
+    progress=None,
+    pg_schema: str = "public",
+    filters: Optional[Dict[str, TableFilter]] = None,
+    compact_json: bool = False,
+    throttle: Optional[Throttle] = None,
+) -> None:
+    """Migrate tables with psycopg 3 async COPY, `max_streams` tables at a time.
+
+    All tables are truncated first in one statement; each table is then
+    copied and committed on its own pooled connection, while SQLite reads
+    run in a thread pool. `character varying(n)` lengths are read once, and
+    values changed on the way are printed per table as with `migrate_table`.
+    `throttle` limits the rate of all streams together.
+    """
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    if progress is None:
+        progress = NullProgressReporter()
+    if tables:
+        asyncio.run(_async_migrate(
+            db_url, sqlite_path, tables, row_counts, max_streams, progress, pg_schema,
+            filters or {}, compact_json, throttle,
+        ))
+
+
+SCHEMA_NAME = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+@dataclass
+class Tenant:
+    """One SQLite database to migrate, from a `--tenants` manifest."""
+
+    name: str
+    sqlite_path: Path
+    database_url: str
+    schema: str = "public"
+
+
+@dataclass
+class TenantResult:
+    """Outcome of migrating one tenant."""
+
+    tenant: Tenant
+    tables: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+def read_tenants(path: Path, default_database_url: Optional[str] = None) -> List[Tenant]:
+    """Read a tenants manifest.
+
+    The manifest is JSON: `{"tenants": [{"name": ..., "sqlite_path": ...,
+    "database_url": ..., "schema": ...}]}`. `database_url` defaults to
+    `default_database_url`, and `schema` to `public`.
+    """
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    tenants = []
+    for item in data.get("tenants", []):
+        try:
+            name = item["name"]
+            sqlite_path = Path(item["sqlite_path"])
+        except KeyError as e:
+            raise RuntimeError(f"Tenant in {path} is missing {e}") from e
+        database_url = item.get("database_url", default_database_url)
+        if not database_url:
+            raise RuntimeError(f"Tenant {name} has no database_url")
+        schema = item.get("schema", "public")
+        if not SCHEMA_NAME.match(schema):
+            raise RuntimeError(f"Invalid schema name for tenant {name}: {schema}")
+        tenants.append(Tenant(name, sqlite_path, database_url, schema))
+
+    names = [t.name for t in tenants]
+    if len(set(names)) != len(names):
+        raise RuntimeError(f"Duplicate tenant names in {path}")
+    targets = [(t.database_url, t.schema) for t in tenants]
+    if len(set(targets)) != len(targets):
+        raise RuntimeError(f"Tenants in {path} share a database and schema")
+    return tenants
+
+
+class ConnectionBudget:
+    """Limit on open Postgres connections, shared by concurrent migrations.
+
+    `hold(n)` waits until `n` connections are free and takes them all at
+    once, so two migrations never wait for each other's share. More than
+    `limit` is taken as `limit`.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._free = limit
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def hold(self, connections: int = 1):
+        """Count `connections` against the budget while the block runs."""
+        connections = min(connections, self.limit)
+        with self._cond:
+            self._cond.wait_for(lambda: self._free >= connections)
+            self._free -= connections
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._free += connections
+                self._cond.notify_all()
+
+
+def migrate_tenant(
+    tenant: Tenant,
+    config: "MigrationConfig",
+    budget: Optional[ConnectionBudget] = None,
+    rejects: Optional[RejectWriter] = None,
+) -> TenantResult:
+    """Migrate one tenant into its schema with `Migrator`. Errors are returned, not raised.
+
+    `config` holds the options of all tenants; the SQLite path, database
+    URL and schema are the tenant's. Rows rejected by any tenant go to the
+    shared `rejects`.
+    """
+    result = TenantResult(tenant)
+    start_time = time.time()
+    migrator = Migrator(
+        replace(
+            config,
+            sqlite_path=tenant.sqlite_path,
+            database_url=tenant.database_url,
+            pg_schema=tenant.schema,
+            reject_file=None,
+        ),
+        label_prefix=f"{tenant.name}/",
+        budget=budget,
+        rejects=rejects,
+    )
+    try:
+        migrated = migrator.run()
+        result.tables = len(migrated.tables)
+        result.rows = sum(t.rows for t in migrated.tables)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        result.error = str(e) or type(e).__name__
+    result.seconds = time.time() - start_time
+    return result
+
+
+def migrate_tenants(
+    tenants: List[Tenant],
+    config: "MigrationConfig",
+    max_parallel: int = 4,
+    max_connections: Optional[int] = None,
+    rejects: Optional[RejectWriter] = None,
+) -> List[TenantResult]:
+    """Migrate tenants concurrently, with a global limit on Postgres connections.
+
+    With the `atomic` transaction policy, each tenant is one transaction.
+    """
+    budget = ConnectionBudget(max_connections or max_parallel)
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        return list(executor.map(
+            lambda t: migrate_tenant(t, config, budget, rejects), tenants
+        ))
+
+
+def print_tenant_results(results: List[TenantResult]) -> None:
+    """Print the combined `--tenants` report."""
+    from rich.table import Table  # pylint: disable=import-outside-toplevel
+
+    table = Table(title="Tenant Migration")
+    table.add_column("Tenant", style="cyan")
+    table.add_column("Schema")
+    table.add_column("Tables", justify="right")
+    table.add_column("Rows", justify="right", style="green")
+    table.add_column("Time", justify="right")
+    table.add_column("Status")
+    for r in results:
+        table.add_row(
+            r.tenant.name,
+            r.tenant.schema,
+            f"{r.tables:,}",
+            f"{r.rows:,}",
+            f"{r.seconds:.2f}s",
+            f"[red]{r.error}[/]" if r.error else "[green]✓[/]",
+        )
+    table.add_row(
+        "[bold]Total[/]", "",
+        f"[bold]{sum(r.tables for r in results):,}[/]",
+        f"[bold]{sum(r.rows for r in results):,}[/]",
+        "", "",
+    )
+    console.print(table)
+
+
+def print_finalization(results: List[TableFinalization], seconds: float) -> None:
+    """Print sequences set and ANALYZE or VACUUM time per table, and the total time."""
+    from rich.table import Table  # pylint: disable=import-outside-toplevel
+
+    table = Table(title="Finalization")
+    table.add_column("Table", style="cyan")
+    table.add_column("Sequences")
+    table.add_column("Statistics")
+    table.add_column("Time", justify="right")
+    for r in results:
+        table.add_row(
+            r.table,
+            ", ".join(f"{seq} → {value:,}" for seq, value in r.sequences.items()),
+            "VACUUM (FREEZE, ANALYZE)" if r.vacuumed else "ANALYZE",
+            f"{r.seconds:.2f}s",
+        )
+    table.add_row(
+        "[bold]Total[/]", "", "", f"[bold]{seconds:.2f}s[/]"
+    )
+    console.print(table)
+
+
+def print_panel(text: str, style: str) -> None:
+    """Print a heading in a box."""
+    from rich.panel import Panel  # pylint: disable=import-outside-toplevel
+
+    console.print(Panel(text, style=style))
+
+
+def print_throttle(throttle: Throttle) -> None:
+    """How often the adaptive throttle backed off, and the rate it ended at."""
+    limit = "no limit" if throttle.rate is None else format_bytes_rate(throttle.rate)
+    console.print(f"[dim]Throttle: {throttle.backoffs} backoffs, ended at {limit}[/]")
+
+
+def print_row_counts(title: str, counts: Dict[str, int]) -> None:
+    """Print row counts per table, with a total."""
+    from rich.table import Table  # pylint: disable=import-outside-toplevel
+
+    table = Table(title=title)
+    table.add_column("Table", style="cyan")
+    table.add_column("Rows", justify="right", style="green")
+    for t, count in counts.items():
+        table.add_row(t, f"{count:,}")
+    table.add_row("[bold]Total[/]", f"[bold]{sum(c for c in counts.values() if c > 0):,}[/]")
+    console.print(table)
+
+
+def print_validation(counts: Dict[str, Tuple[int, int]]) -> List[str]:
+    """Print SQLite and PostgreSQL row counts side by side; returns mismatching tables."""
+    from rich.table import Table  # pylint: disable=import-outside-toplevel
+
+    mismatches = []
+    result_table = Table(title="Validation Results")
+    result_table.add_column("Table", style="cyan")
+    result_table.add_column("SQLite", justify="right", style="yellow")
+    result_table.add_column("PostgreSQL", justify="right", style="green")
+    result_table.add_column("Status", justify="center")
+
+    for t, (sqlite_count, pg_count) in counts.items():
+        if sqlite_count == pg_count:
+            status = "[green]✓[/]"
+        elif sqlite_count == -1 or pg_count == -1:
+            status = "[yellow]N/A[/]"
+        else:
+            status = "[red]✗[/]"
+            mismatches.append(t)
+        result_table.add_row(t, f"{sqlite_count:,}", f"{pg_count:,}", status)
+
+    console.print(result_table)
+
+    if mismatches:
+        console.print(f"[red]Mismatches found in:[/] {', '.join(mismatches)}")
+    else:
+        console.print("[green]All tables match![/]")
+    return mismatches
+
+
+@dataclass
+class MigrationConfig:
+    """Settings of a migration. The command line options map to these fields."""
+
+    sqlite_path: Optional[Path]
+    database_url: Optional[str]
+    pg_schema: str = "public"
+    dry_run: Union[bool, str] = False
+    sample_rows: Optional[int] = None
+    chunk_rows: int = 100_000
+    transaction: str = "per-table"
+    jobs: int = 4
+    engine: str = "psycopg2"
+    max_streams: int = 4
+    load_mode: str = "truncate"
+    small_table_rows: Optional[int] = None
+    reject_file: Optional[Path] = None
+    progress: str = "none"
+    progress_interval: float = 10.0
+    include: List[str] = field(default_factory=list)
+    exclude: List[str] = field(default_factory=list)
+    where: Dict[str, str] = field(default_factory=dict)
+    exclude_columns: Dict[str, List[str]] = field(default_factory=dict)
+    order: Dict[str, str] = field(default_factory=dict)
+    compact_json: bool = False
+    max_rate: Optional[float] = None
+    throttle_on: Optional[str] = None
+    throttle_target: Optional[float] = None
+    finalize: bool = True
+    vacuum_freeze_rows: Optional[int] = None
+
+    def check(self) -> None:
+        """Raise ValueError for options the chosen engine can not honour."""
+        if self.engine != "async":
+            return
+        unsupported = []
+        if self.transaction != "per-table":
+            unsupported.append(f"--transaction {self.transaction}")
+        if self.reject_file is not None:
+            unsupported.append("--reject-file")
+        if self.small_table_rows is not None:
+            unsupported.append("--small-table-rows")
+        if self.load_mode != "truncate":
+            unsupported.append(f"--load-mode {self.load_mode}")
+        if unsupported:
+            raise ValueError(
+                f"--engine async does not support {', '.join(unsupported)}: "
+                "it truncates and commits each table on its own connection"
+            )
+
+    @classmethod
+    def from_env(cls, sqlite: bool = True, postgres: bool = True, **kwargs) -> "MigrationConfig":
+        """Config with the paths from `SQLITE_DB_PATH` and `MIGRATE_DATABASE_URL`.
+
+        Only the variables for `sqlite` and `postgres` are required; a
+        missing optional one leaves its field None.
+        """
+        sqlite_path = env("SQLITE_DB_PATH", required=sqlite)
+        return cls(
+            sqlite_path=Path(sqlite_path) if sqlite_path is not None else None,
+            database_url=env("MIGRATE_DATABASE_URL", required=postgres),
+            **kwargs,
+        )
+
+
+@dataclass
+class TableMetrics:
+    """Rows, COPY bytes and time of one migrated table."""
+
+    table: str
+    rows: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+
+class CallbackProgressReporter:
+    """Progress reporter that also calls back, and keeps `TableMetrics` per table.
+
+    `on_progress(table, rows, nbytes)` is called for every batch of rows,
+    `on_metrics(metrics)` when a table is done. Everything is passed on to
+    `inner`.
+    """
+
+    def __init__(
+        self,
+        inner=None,
+        on_progress: Optional[Callable[[str, int, int], None]] = None,
+        on_metrics: Optional[Callable[[TableMetrics], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.inner = inner if inner is not None else NullProgressReporter()
+        self.on_progress = on_progress
+        self.on_metrics = on_metrics
+        self.metrics: List[TableMetrics] = []
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._running: Dict[str, Tuple[TableMetrics, float]] = {}
+
+    def __enter__(self):
+        self.inner.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.inner.__exit__(*exc)
+
+    def start_table(self, table: str, total_rows: int):
+        with self._lock:
+            self._running[table] = (TableMetrics(table), self._clock())
+        self.inner.start_table(table, total_rows)
+
+    def advance(self, table: str, rows: int, nbytes: int):
+        with self._lock:
+            metrics = self._running[table][0]
+            metrics.rows += rows
+            metrics.bytes += nbytes
+        self.inner.advance(table, rows, nbytes)
+        if self.on_progress is not None:
+            self.on_progress(table, rows, nbytes)
+
+    def finish_table(self, table: str):
+        with self._lock:
+            metrics, started = self._running.pop(table)
+            metrics.seconds = self._clock() - started
+            self.metrics.append(metrics)
+        self.inner.finish_table(table)
+        if self.on_metrics is not None:
+            self.on_metrics(metrics)
+
+
+@dataclass
+class MigrationResult:
+    """What `Migrator.run()` did."""
+
+    tables: List[TableMetrics] = field(default_factory=list)
+    merged: MergeResult = field(default_factory=MergeResult)
+    commits: CommitStats = field(default_factory=CommitStats)
+    measurements: List[TableMeasurement] = field(default_factory=list)
+    rejected: int = 0
+    finalized: List[TableFinalization] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def _sqlite_table_names(sqlite_conn) -> List[str]:
+    return sorted(
+        r[0] for r in sqlite_conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    )
+
+
+class Migrator:
+    """Migration of one Open WebUI SQLite database, for use from Python.
+
+        migrator = Migrator(MigrationConfig(Path("webui.db"), "postgresql://..."))
+        result = migrator.run()
+
+    `on_progress` and `on_metrics` are passed to `CallbackProgressReporter`.
+    Table names are printed with `label_prefix`. The connections `run()`
+    opens are counted against `budget`, and rejected rows go to `rejects`
+    instead of `config.reject_file` when it is given.
+    Nothing is read from the environment; see `MigrationConfig.from_env()`.
+    """
+
+    def __init__(
+        self,
+        config: MigrationConfig,
+        on_progress: Optional[Callable[[str, int, int], None]] = None,
+        on_metrics: Optional[Callable[[TableMetrics], None]] = None,
+        label_prefix: str = "",
+        budget: Optional[ConnectionBudget] = None,
+        rejects: Optional[RejectWriter] = None,
+    ):
+        self.config = config
+        self.on_progress = on_progress
+        self.on_metrics = on_metrics
+        self.label_prefix = label_prefix
+        self.budget = budget
+        self.rejects = rejects
+
+    def _hold(self, connections: int):
+        return nullcontext() if self.budget is None else self.budget.hold(connections)
+
+    def _connections(self, dry_run: Union[bool, str]) -> Tuple[int, int]:
+        """Connections open at once while tables are copied, and the async streams among them.
+
+        With a budget, the streams are lowered to fit in it; ValueError if
+        not even one stream fits.
+        """
+        config = self.config
+        connections = 1
+        if config.throttle_on is not None and not dry_run:
+            connections += 1
+        streams = config.max_streams if config.engine == "async" and not dry_run else 0
+        if self.budget is not None:
+            needed = connections + min(streams, 1)
+            if needed > self.budget.limit:
+                raise ValueError(
+                    f"--max-connections {self.budget.limit} is too low, "
+                    f"each migration needs at least {needed} connections"
+                )
+            streams = min(streams, self.budget.limit - connections)
+        return connections + streams, streams
+
+    def _postgres_tables(self, pg_conn) -> List[str]:
+        with pg_conn.cursor() as cur:
+            cur.execute(
+                "SELECT table_name FROM information_schema.tables "
+                "WHERE table_schema = %s",
+                (self.config.pg_schema,),
+            )
+            return sorted([r[0] for r in cur.fetchall()])
+
+    def _selected(self, tables: List[str]) -> List[str]:
+        return select_tables(tables, self.config.include, self.config.exclude)
+
+    def check_filters(self) -> None:
+        """Raise ValueError when a filter names a table the SQLite database does not have."""
+        config = self.config
+        if not (config.where or config.exclude_columns or config.order):
+            return
+        sqlite_conn = open_sqlite_readonly(config.sqlite_path)
+        try:
+            check_filter_tables(
+                sqlite_conn, config.where, config.exclude_columns, config.order
+            )
+        finally:
+            sqlite_conn.close()
+
+    def _filters(self, sqlite_conn, tables: List[str]) -> Dict[str, TableFilter]:
+        return table_filters(
+            sqlite_conn, tables, self.config.where, self.config.exclude_columns,
+            self.config.order,
+        )
+
+    def throttle(self, commit_stats: CommitStats):
+        """The configured `Throttle`, or None, and a context to run the COPY in.
+
+        With `throttle_on="commit-latency"` the throttle observes the
+        commits of `commit_stats` and the context runs a
+        `CommitLatencyMonitor`; with `"replication-lag"` it runs a
+        `ReplicationLagMonitor`.
+        """
+        config = self.config
+        throttle = make_throttle(config.max_rate, config.throttle_on, config.throttle_target)
+        if throttle is None or config.throttle_on is None:
+            return throttle, nullcontext()
+        if config.throttle_on == "commit-latency":
+            commit_stats.on_commit = throttle.observe
+            return throttle, CommitLatencyMonitor(config.database_url, throttle)
+        return throttle, ReplicationLagMonitor(config.database_url, throttle)
+
+    def finalize(
+        self, tables: List[str], row_counts: Dict[str, int]
+    ) -> List[TableFinalization]:
+        """Run and print `finalize_tables()` with the configured jobs and VACUUM threshold.
+
+        The jobs' connections are counted against the budget.
+        """
+        console.print("[cyan]Finalizing tables...[/]")
+        start_time = time.time()
+        jobs = max(min(self.config.jobs, len(tables)), 1)
+        if self.budget is not None:
+            jobs = min(jobs, self.budget.limit)
+        with self._hold(jobs):
+            finalized = finalize_tables(
+                self.config.database_url, tables, row_counts,
+                pg_schema=self.config.pg_schema,
+                jobs=jobs,
+                vacuum_freeze_rows=self.config.vacuum_freeze_rows,
+            )
+        print_finalization(finalized, time.time() - start_time)
+        return finalized
+
+    def sqlite_counts(self, estimate: bool = False) -> Dict[str, int]:
+        """Row counts of all SQLite tables, read in place; from sqlite_stat1 with `estimate`."""
+        sqlite_conn = open_sqlite_readonly(self.config.sqlite_path)
+        try:
+            tables = _sqlite_table_names(sqlite_conn)
+            if estimate:
+                return sqlite_row_estimates(sqlite_conn, tables)
+        finally:
+            sqlite_conn.close()
+        return sqlite_row_counts_parallel(self.config.sqlite_path, tables, self.config.jobs)
+
+    def postgres_counts(self) -> Dict[str, int]:
+        """Row counts of all tables in the configured schema."""
+        pg_conn = psycopg2.connect(self.config.database_url)
+        try:
+            with pg_conn.cursor() as cur:
+                cur.execute(f"SET search_path TO {self.config.pg_schema}")
+            return postgres_row_counts(pg_conn, self._postgres_tables(pg_conn))
+        finally:
+            pg_conn.close()
+
+    def validate(self) -> Dict[str, Tuple[int, int]]:
+        """SQLite and PostgreSQL row counts of every selected table in either.
+
+        SQLite rows are counted with the configured filters.
+        """
+        sqlite_conn = open_sqlite_readonly(self.config.sqlite_path)
+        try:
+            tables = self._selected(_sqlite_table_names(sqlite_conn))
+            filters = self._filters(sqlite_conn, tables)
+        finally:
+            sqlite_conn.close()
+        sqlite_counts = sqlite_row_counts_parallel(
+            self.config.sqlite_path, tables, self.config.jobs, filters
+        )
+        pg_counts = self.postgres_counts()
+        pg_counts = {t: pg_counts[t] for t in self._selected(list(pg_counts))}
+        return {
+            t: (sqlite_counts.get(t, 0), pg_counts.get(t, 0))
+            for t in sorted(set(sqlite_counts) | set(pg_counts))
+        }
+
+    def run(self) -> MigrationResult:
+        """Migrate a copy of the SQLite database.
+
+        Raises ValueError for options the engine does not support (see
+        `MigrationConfig.check()`) or that do not fit in the connection
+        budget, and the error when a table fails.
+        """
+        config = self.config
+        config.check()
+        dry_run = config.dry_run
+        needed, streams = self._connections(dry_run)
+        result = MigrationResult()
+        start_time = time.time()
+        print_panel(
+            f"SQLite to PostgreSQL Migration {'(DRY-RUN)' if dry_run else ''}", "cyan"
+        )
+
+        console.print("[cyan]Creating temporary SQLite copy...[/]")
+        sqlite_copy_path = copy_sqlite_db(config.sqlite_path)
+        console.print(f"[green]Using SQLite copy:[/] {sqlite_copy_path}")
+
+        connections = ExitStack()
+        try:
+            validate_sqlite(sqlite_copy_path)
+            connections.enter_context(self._hold(needed))
+            validate_postgres(config.database_url)
+        except Exception:
+            connections.close()
+            shutil.rmtree(sqlite_copy_path.parent, ignore_errors=True)
+            raise
+
+        sqlite_conn = open_sqlite_snapshot(sqlite_copy_path)
+        sqlite_conn.isolation_level = None
+
+        pg_conn = psycopg2.connect(config.database_url)
+        with pg_conn.cursor() as cur:
+            cur.execute(f"SET search_path TO {config.pg_schema}")
+
+        if dry_run:
+            with pg_conn.cursor() as cur:
+                cur.execute("SET default_transaction_read_only = on")
+            console.print("[yellow]DRY-RUN: PostgreSQL session is read-only[/]")
+        else:
+            with pg_conn.cursor() as cur:
+                cur.execute("SET session_replication_role = replica")
+            pg_conn.commit()
+
+        tables = self._selected(sqlite_tables(sqlite_conn))
+        filters = self._filters(sqlite_conn, tables)
+        row_counts = sqlite_row_counts(sqlite_conn, tables, filters)
+
+        rejects = self.rejects
+        if rejects is None and config.reject_file:
+            rejects = RejectWriter(config.reject_file)
+        throttle, monitor = (None, nullcontext()) if dry_run else self.throttle(result.commits)
+        progress = CallbackProgressReporter(
+            make_progress_reporter(
+                config.progress, row_counts, config.progress_interval, throttle
+            ),
+            self.on_progress,
+            self.on_metrics,
+        )
+        try:
+            with progress, monitor:
+                if config.engine == "async" and not dry_run:
+                    async_migrate(
+                        config.database_url, sqlite_copy_path, tables, row_counts,
+                        streams, progress, config.pg_schema, filters,
+                        compact_json=config.compact_json, throttle=throttle,
+                    )
+                elif dry_run == "measure":
+                    max_lengths = pg_column_lengths_bulk(pg_conn, tables, config.pg_schema)
+                    for table in tables:
+                        result.measurements.append(measure_table(
+                            sqlite_conn, pg_conn, table, max(row_counts[table], 0),
+                            sample_rows=config.sample_rows,
+                            progress=progress,
+                            max_lengths=max_lengths[table],
+                            table_filter=filters[table],
+                            compact_json=config.compact_json,
+                            pg_schema=config.pg_schema,
+                        ))
+                else:
+                    result.merged = migrate_tables(
+                        sqlite_conn, pg_conn, tables, row_counts,
+                        progress=progress,
+                        pg_schema=config.pg_schema,
+                        label_prefix=self.label_prefix,
+                        rejects=rejects,
+                        chunk_rows=config.chunk_rows,
+                        transaction=config.transaction,
+                        commit_stats=result.commits,
+                        load_mode=config.load_mode,
+                        small_table_rows=SMALL_TABLE_ROWS
+                        if config.small_table_rows is None else config.small_table_rows,
+                        dry_run=dry_run,
+                        filters=filters,
+                        compact_json=config.compact_json,
+                        throttle=throttle,
+                    )
+            if config.transaction == "atomic" and not dry_run:
+                result.commits.commit(pg_conn)
+        except Exception:
+            pg_conn.rollback()
+            console.print(
+                "[red]Migration failed, "
+                + {
+                    "atomic": "nothing was committed",
+                    "per-table": "tables before the failing one are committed",
+                    "per-chunk": "committed chunks of the failing table are kept",
+                }[config.transaction]
+                + "[/]"
+            )
+            sqlite_conn.close()
+            pg_conn.close()
+            connections.close()
+            shutil.rmtree(sqlite_copy_path.parent, ignore_errors=True)
+            if rejects is not None and rejects is not self.rejects:
+                rejects.close()
+            raise
+        result.tables = progress.metrics
+
+        if result.commits.count:
+            console.print(
+                f"[dim]Transactions ({config.transaction}): {result.commits.summary()}[/]"
+            )
+
+        if throttle is not None and throttle.target is not None:
+            print_throttle(throttle)
+
+        if config.load_mode == "merge" and not dry_run:
+            merged = result.merged
+            console.print(
+                f"[green]Merge total:[/] {merged.inserted:,} inserted, "
+                f"{merged.updated:,} updated, {merged.unchanged:,} unchanged"
+            )
+
+        if result.measurements:
+            print_measurements(result.measurements)
+
+        if rejects is not None and rejects is not self.rejects:
+            rejects.close()
+            result.rejected = rejects.count
+            if rejects.count:
+                console.print(
+                    f"[yellow]{rejects.count} rows rejected, written to {rejects.path}[/]"
+                )
+
+        sqlite_conn.close()
+        shutil.rmtree(sqlite_copy_path.parent, ignore_errors=True)
+
+        if not dry_run:
+            with pg_conn.cursor() as cur:
+                cur.execute("SET session_replication_role = origin")
+            pg_conn.commit()
+
+        pg_conn.close()
+        connections.close()
+
+        if config.finalize and not dry_run:
+            result.finalized = self.finalize(tables, row_counts)
+
+        print_panel("Done", "green")
+        result.seconds = time.time() - start_time
+        return result
+
+
+def main():
+    """ Run the script """
+    args = parse_args()
+    config = MigrationConfig.from_env(
+        # --extract and --sqlite-counts never connect to PostgreSQL, --load and
+        # --postgres-counts never read SQLite, and --tenants reads both from its manifest.
+        sqlite=not (args.load or args.tenants or args.postgres_counts),
+        postgres=not (args.extract or args.sqlite_counts or args.tenants),
+        dry_run=args.dry_run,
+        sample_rows=args.sample_rows,
+        chunk_rows=args.chunk_rows,
+        transaction=args.transaction,
+        jobs=args.jobs,
+        engine=args.engine,
+        max_streams=args.max_streams,
+        load_mode=args.load_mode,
+        small_table_rows=args.small_table_rows,
+        reject_file=args.reject_file,
+        progress=args.progress,
+        progress_interval=args.progress_interval,
+        include=args.include or [],
+        exclude=args.exclude or [],
+        where=dict(args.where or []),
+        order=dict(args.order or []),
+        compact_json=args.compact_json,
+        max_rate=args.max_rate,
+        throttle_on=args.throttle_on,
+        throttle_target=args.throttle_target,
+        finalize=not args.skip_finalize,
+        vacuum_freeze_rows=args.vacuum_freeze_rows,
+        exclude_columns={
+            table: [c for t, c in args.exclude_column if t == table]
+            for table, _ in args.exclude_column or []
+        },
+    )
+    migrator = Migrator(config)
+
+    if args.sqlite_counts:
+        counts = migrator.sqlite_counts(estimate=args.estimate)
+        print_row_counts(
+            "SQLite Row Estimates" if args.estimate else "SQLite Row Counts", counts
+        )
+        if args.estimate:
+            console.print("[dim]Estimates are from the last ANALYZE, -1 means no statistics.[/]")
+        return
+
+    if args.extract:
+        try:
+            migrator.check_filters()
+        except ValueError as e:
+            console.print(f"[red]{e}[/]")
+            sys.exit(2)
+        print_panel(f"Extract to {args.extract}", "cyan")
+        sqlite_copy_path = copy_sqlite_db(config.sqlite_path)
+        validate_sqlite(sqlite_copy_path)
+        sqlite_conn = open_sqlite_snapshot(sqlite_copy_path)
+        tables = select_tables(sqlite_tables(sqlite_conn), config.include, config.exclude)
+        filters = table_filters(
+            sqlite_conn, tables, config.where, config.exclude_columns, config.order
+        )
+        row_counts = sqlite_row_counts(sqlite_conn, tables, filters)
+
+        with make_progress_reporter(
+            args.progress, row_counts, args.progress_interval
+        ) as progress:
+            manifest = extract_tables(
+                sqlite_conn, args.extract, args.chunk_rows, progress, row_counts,
+                tables, filters, config.compact_json,
+            )
+
+        sqlite_conn.close()
+        shutil.rmtree(sqlite_copy_path.parent, ignore_errors=True)
+        files = sum(len(t["chunks"]) for t in manifest["tables"])
+        console.print(
+            f"[green]Extracted {len(manifest['tables'])} tables into {files} files[/]"
+        )
+        return
+
+    if args.load:
+        unsupported = ["--dry-run"] if config.dry_run else []
+        if config.load_mode != "truncate":
+            unsupported.append(f"--load-mode {config.load_mode}")
+        if unsupported:
+            console.print(
+                f"[red]--load does not support {', '.join(unsupported)}: "
+                "it truncates the tables and copies the files into them[/]"
+            )
+            sys.exit(2)
+        steps = set(args.load_step or LOAD_STEPS)
+        print_panel(f"Load from {args.load}", "cyan")
+        manifest = read_manifest(args.load)
+        tables = select_tables(
+            [t["name"] for t in manifest["tables"]], config.include, config.exclude
+        )
+        row_counts = {t["name"]: t["rows"] for t in manifest["tables"] if t["name"] in tables}
+        if "copy" in steps:
+            start_time = time.time()
+            commit_stats = CommitStats()
+            throttle, monitor = migrator.throttle(commit_stats)
+            with monitor, make_progress_reporter(
+                args.progress, row_counts, args.progress_interval, throttle
+            ) as progress:
+                loaded = load_directory(
+                    config.database_url, args.load, args.jobs, progress, throttle,
+                    commit_stats, tables, args.load_shard, truncate="truncate" in steps,
+                )
+            console.print(
+                f"[green]Loaded {sum(loaded.values()):,} rows in "
+                f"{time.time() - start_time:.2f}s[/]"
+            )
+            if throttle is not None and throttle.target is not None:
+                print_throttle(throttle)
+        elif "truncate" in steps:
+            pg_conn = psycopg2.connect(config.database_url)
+            try:
+                truncate_tables(pg_conn, tables)
+            finally:
+                pg_conn.close()
+            console.print(f"[green]Truncated {len(tables)} tables[/]")
+        if config.finalize and "finalize" in steps:
+            migrator.finalize(tables, row_counts)
+        return
+
+    try:
+        if not (args.postgres_counts or args.validate):
+            config.check()
+        if not (args.tenants or args.postgres_counts):
+            migrator.check_filters()
+    except ValueError as e:
+        console.print(f"[red]{e}[/]")
+        sys.exit(2)
+
+    if args.tenants:
+        tenants = read_tenants(args.tenants, config.database_url)
+        print_panel(f"Migrate {len(tenants)} tenants", "cyan")
+        rejects = RejectWriter(args.reject_file) if args.reject_file else None
+        results = migrate_tenants(
+            tenants, config, args.max_parallel, args.max_connections, rejects
+        )
+        print_tenant_results(results)
+        if rejects is not None:
+            rejects.close()
+        if any(r.error for r in results):
+            sys.exit(1)
+        return
+
+    if args.postgres_counts:
+        print_row_counts("PostgreSQL Row Counts", migrator.postgres_counts())
+        return
+
+    if args.validate:
+        print_panel("Validate Migration", "cyan")
+        print_validation(migrator.validate())
+        return
+
+    migrator.run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,146 @@
+"""Test the psycopg 3 async engine"""
+
+import sqlite3
+from contextlib import asynccontextmanager
+
+import pytest
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import Throttle, async_migrate, async_pool_class
+
+
+class FakeCopy:
+    def __init__(self, sql, copied):
+        self.sql = sql
+        self.rows = []
+        copied.append(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def write_row(self, row):
+        self.rows.append(row)
+
+
+class FakeCursor:
+    def __init__(self, pool, sql=""):
+        self.pool = pool
+        self.sql = sql
+
+    async def fetchall(self):
+        if "character_maximum_length" in self.sql:
+            return [("chat", "id", 3)]
+        return [("id", "character varying"), ("meta", "jsonb"), ("name", "text")]
+
+    def copy(self, sql):
+        return FakeCopy(sql, self.pool.copied)
+
+    async def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def execute(self, sql, params=None):
+        self.pool.executed.append(sql)
+        return FakeCursor(self.pool, sql)
+
+    def cursor(self):
+        return FakeCursor(self.pool)
+
+    async def commit(self):
+        pass
+
+
+class FakePool:
+    instances = []
+
+    def __init__(self, url, min_size, max_size, configure, open):
+        self.url = url
+        self.max_size = max_size
+        self.configure = configure
+        self.executed = []
+        self.copied = []
+        self.closed = False
+        FakePool.instances.append(self)
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = FakeConn(self)
+        await self.configure(conn)
+        yield conn
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    path = tmp_path / "webui.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE chat (id TEXT, meta TEXT, name TEXT)")
+    conn.execute("CREATE TABLE tag (id TEXT)")
+    conn.executemany(
+        "INSERT INTO chat VALUES (?, ?, ?)",
+        [(str(i), "{bad" if i == 0 else "{}", None) for i in range(1200)],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_async_migrate(sqlite_path, monkeypatch):
+    FakePool.instances.clear()
+    monkeypatch.setattr(migrate, "async_pool_class", lambda: FakePool)
+
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+    throttle = Throttle(max_rate=1e12)
+    async_migrate(
+        "postgresql://example", sqlite_path, ["chat", "tag"],
+        {"chat": 1200, "tag": 0}, max_streams=2, throttle=throttle,
+    )
+
+    pool, = FakePool.instances
+    assert pool.max_size == 2
+    assert pool.closed
+    assert "TRUNCATE TABLE chat, tag CASCADE" in pool.executed
+    assert "SET session_replication_role = replica" in pool.executed
+    assert "SET search_path TO public" in pool.executed
+
+    chat = next(c for c in pool.copied if c.sql.startswith("COPY chat"))
+    assert chat.sql == "COPY chat (id, meta, name) FROM STDIN"
+    assert len(chat.rows) == 1200
+    assert chat.rows[0] == ("0", "{}", None)
+    assert chat.rows[1100] == ("110", "{}", None)
+    assert any(
+        line.startswith("[yellow]chat.id:[/] 200 values changed") for line in lines
+    )
+    assert throttle.effective_rate() > 0
+
+
+def test_async_migrate_without_tables(monkeypatch):
+    monkeypatch.setattr(migrate, "async_pool_class", lambda: pytest.fail("no pool needed"))
+    async_migrate("postgresql://example", "unused.db", [], {})
+
+
+def test_async_pool_class_missing(monkeypatch):
+    import builtins
+    real_import = builtins.__import__
+
+    def fake_import(name, *args, **kwargs):
+        if name == "psycopg_pool":
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", fake_import)
+    with pytest.raises(RuntimeError, match=r"open-webui-sqlite-migration\[async\]"):
+        async_pool_class()
@@ -0,0 +1,82 @@
+"""Test JSON compaction"""
+
+import json
+import sqlite3
+from collections import Counter
+from unittest.mock import MagicMock
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import compact_json_value, normalize_row
+
+
+def test_compact_json_value():
+    original = json.dumps({"a": [1, 2], "b": "é"}, indent=2, ensure_ascii=False)
+
+    compact, saved = compact_json_value(original)
+
+    assert compact == '{"a":[1,2],"b":"é"}'
+    assert saved == len(original.encode("utf-8")) - len(compact.encode("utf-8"))
+
+
+def test_compact_json_value_keeps_tokens():
+    original = '{"a": 1E5, "b": [0.1000000000000000055511151231257827, -0], "c": "x , \\" y"}'
+
+    compact, saved = compact_json_value(original)
+
+    assert compact == '{"a":1E5,"b":[0.1000000000000000055511151231257827,-0],"c":"x , \\" y"}'
+    assert saved == 6
+    assert compact_json_value('{"a": "\\ud800"}') == ('{"a":"\\ud800"}', 1)
+
+
+def test_normalize_row_compact_json():
+    saved = Counter()
+    row = ('{\n  "a": 1E5\n}', '{"b": 2}', {"c": [1, 2]}, "x")
+
+    result = normalize_row(
+        row, ["meta", "params", "chat", "title"],
+        {"meta": "jsonb", "params": "jsonb", "chat": "jsonb", "title": "text"},
+        compact_json=saved,
+    )
+
+    assert result == ('{"a":1E5}', '{"b":2}', '{"c":[1,2]}', "x")
+    assert saved == {"meta": 5, "params": 1}
+
+
+def test_normalize_row_without_compaction_keeps_json_text():
+    assert normalize_row(('{ "a": 1 }',), ["meta"], {"meta": "jsonb"}) == ('{ "a": 1 }',)
+
+
+def _sqlite():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE chat (id INTEGER, meta TEXT)")
+    conn.executemany("INSERT INTO chat VALUES (?, ?)", [(i, '{ "a": 1 }') for i in range(4)])
+    return conn
+
+
+def test_migrate_table_compact_json(monkeypatch):
+    monkeypatch.setattr(
+        migrate, "pg_column_types", lambda conn, table, schema="public": {"meta": "jsonb"}
+    )
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    copied = []
+    cursor.copy_expert.side_effect = lambda sql, stream: copied.append(stream.read(1 << 16))
+
+    migrate.migrate_table(_sqlite(), pg_conn, "chat", compact_json=True)
+
+    assert copied == ['0,"{""a"":1}"\n1,"{""a"":1}"\n2,"{""a"":1}"\n3,"{""a"":1}"\n']
+    assert "[green]chat.meta:[/] 12.0 B saved by JSON compaction" in lines
+
+
+def test_measure_table_compact_json(monkeypatch):
+    monkeypatch.setattr(migrate, "pg_column_types", lambda conn, table, schema="public": {"meta": "jsonb"})
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+
+    m = migrate.measure_table(_sqlite(), MagicMock(), "chat", 4, sample_rows=2, compact_json=True)
+    migrate.print_measurements([m])
+
+    assert m.json_saved == {"meta": 6}
+    assert "[green]chat.meta:[/] ~12.0 B saved by JSON compaction" in lines
@@ -6,11 +6,8 @@ from unittest.mock import MagicMock
 from open_webui_sqlite_migration import migrate
 
 
-def test_migrate_table_dry_run(monkeypatch):
+def test_migrate_table_dry_run():
     """Test dry-run argument."""
-    # Force dry-run
-    monkeypatch.setattr(migrate, "DRY_RUN", True)
-
     # SQLite setup
     sqlite_conn = sqlite3.connect(":memory:")
     sqlite_conn.execute("CREATE TABLE test (id INTEGER)")
@@ -21,7 +18,57 @@ def test_migrate_table_dry_run(monkeypatch):
     pg_conn = MagicMock()
 
     # Run
-    migrate.migrate_table(sqlite_conn, pg_conn, "test")
+    migrate.migrate_table(sqlite_conn, pg_conn, "test", dry_run=True)
 
     pg_conn.cursor.assert_not_called()
     pg_conn.commit.assert_not_called()
+
+
+def _measure_db():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE prompt (id INTEGER, content TEXT, meta TEXT)")
+    conn.executemany(
+        "INSERT INTO prompt VALUES (?, ?, ?)",
+        [(i, None if i % 2 else "x", "{bad" if i == 0 else "{}") for i in range(10)],
+    )
+    return conn
+
+
+def test_measure_table(monkeypatch):
+    """Test that measure mode runs the full pipeline and counts rewrites."""
+    monkeypatch.setattr(
+        migrate, "pg_column_types",
+        lambda conn, table, schema="public": {"id": "integer", "content": "text", "meta": "jsonb"},
+    )
+    pg_conn = MagicMock()
+
+    m = migrate.measure_table(_measure_db(), pg_conn, "prompt", 10)
+
+    assert m.sampled_rows == 10
+    assert m.copy_bytes == 5 * len("0,x,{}\n") + 5 * len("1,,{}\n")
+    assert m.rewrites == {("content", "null to empty string"): 5, ("meta", "invalid json"): 1}
+    assert m.scale == 1
+    assert m.predicted_pg_bytes == m.copy_bytes + 10 * migrate.PG_ROW_OVERHEAD_BYTES
+    pg_conn.commit.assert_not_called()
+
+
+def test_measure_table_sample(monkeypatch):
+    """Test that a sample is extrapolated to the whole table."""
+    monkeypatch.setattr(migrate, "pg_column_types", lambda conn, table, schema="public": {})
+
+    m = migrate.measure_table(_measure_db(), MagicMock(), "prompt", 10, sample_rows=2)
+
+    assert m.sampled_rows == 2
+    assert m.scale == 5
+    assert m.predicted_copy_bytes == m.copy_bytes * 5
+
+
+def test_print_measurements(monkeypatch):
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+    m = migrate.TableMeasurement("chat", rows=4, sampled_rows=2, copy_bytes=2_000_000)
+    m.rewrites[("meta", "invalid json")] = 1
+
+    migrate.print_measurements([m])
+
+    assert any("chat.meta:[/] ~2 values rewritten (invalid json)" in str(l) for l in lines)
@@ -0,0 +1,155 @@
+"""Test extract to files and load from files"""
+
+import gzip
+import json
+import sqlite3
+import sys
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import (
+    extract_tables,
+    load_directory,
+    read_manifest,
+    sqlite_column_types,
+)
+
+
+def _sqlite_db():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE chat (id VARCHAR(255), chat JSON, title TEXT)")
+    conn.execute("CREATE TABLE tag (id TEXT)")
+    conn.executemany(
+        "INSERT INTO chat VALUES (?, ?, ?)",
+        [(str(i), "{bad" if i == 3 else '{"a": 1}', None) for i in range(5)],
+    )
+    return conn
+
+
+def test_sqlite_column_types():
+    assert sqlite_column_types(_sqlite_db(), "chat") == {
+        "id": "character varying",
+        "chat": "jsonb",
+        "title": "text",
+    }
+
+
+def test_extract_tables_writes_chunks_and_manifest(tmp_path):
+    manifest = extract_tables(_sqlite_db(), tmp_path, chunk_rows=2)
+
+    assert manifest == read_manifest(tmp_path)
+    tag, chat = manifest["tables"]
+    assert chat["name"] == "chat"
+    assert chat["columns"] == ["id", "chat", "title"]
+    assert chat["rows"] == 5
+    assert [c["rows"] for c in chat["chunks"]] == [2, 2, 1]
+    assert tag["rows"] == 0 and tag["chunks"] == []
+
+    with gzip.open(tmp_path / chat["chunks"][1]["file"], "rt") as f:
+        assert f.read() == '2,"{""a"": 1}",__NULL__\n3,{},__NULL__\n'
+    assert chat["chunks"][0]["sha256"] == migrate.file_sha256(
+        tmp_path / chat["chunks"][0]["file"]
+    )
+
+
+def test_read_manifest_rejects_unknown_version(tmp_path):
+    (tmp_path / "manifest.json").write_text(json.dumps({"version": 99}))
+    with pytest.raises(RuntimeError):
+        read_manifest(tmp_path)
+
+
+def _mock_pg(monkeypatch):
+    cursor = MagicMock()
+    copied = []
+
+    def fake_copy_expert(sql, stream):
+        copied.append((sql, stream.read().decode()))
+
+    def fake_connect(*args, **kwargs):
+        conn = MagicMock()
+        conn.cursor.return_value.__enter__.return_value = cursor
+        return conn
+
+    cursor.copy_expert.side_effect = fake_copy_expert
+    monkeypatch.setattr(psycopg2, "connect", fake_connect)
+    return fake_connect(), cursor, copied
+
+
+def test_load_directory(tmp_path, monkeypatch):
+    extract_tables(_sqlite_db(), tmp_path, chunk_rows=2)
+    conn, cursor, copied = _mock_pg(monkeypatch)
+    progress = MagicMock()
+
+    loaded = load_directory("postgresql://example", tmp_path, jobs=2, progress=progress)
+
+    assert loaded == {"chat": 5, "tag": 0}
+    cursor.execute.assert_any_call("TRUNCATE TABLE tag, chat CASCADE")
+    cursor.execute.assert_any_call("SET session_replication_role = replica")
+    assert len(copied) == 3
+    assert all(
+        sql == "COPY chat (id, chat, title) FROM STDIN WITH CSV NULL '__NULL__'"
+        for sql, _ in copied
+    )
+    assert sum(data.count("\n") for _, data in copied) == 5
+    assert sorted(c.args[0] for c in progress.finish_table.call_args_list) == ["chat", "tag"]
+
+
+def test_load_directory_shards(tmp_path, monkeypatch):
+    extract_tables(_sqlite_db(), tmp_path, chunk_rows=2)
+    _, cursor, copied = _mock_pg(monkeypatch)
+
+    first = load_directory(
+        "postgresql://example", tmp_path, jobs=1, shard=(1, 2), truncate=False,
+    )
+    second = load_directory(
+        "postgresql://example", tmp_path, jobs=1, tables=["chat"], shard=(2, 2),
+        truncate=False,
+    )
+
+    assert first == {"chat": 3, "tag": 0}
+    assert second == {"chat": 2}
+    assert len(copied) == 3
+    assert not any("TRUNCATE" in c.args[0] for c in cursor.execute.call_args_list)
+
+
+@pytest.mark.parametrize("option, message", [
+    (["--dry-run"], "does not support --dry-run"),
+    (["--load-mode", "merge"], "does not support --load-mode merge"),
+])
+def test_main_refuses_load_options(tmp_path, monkeypatch, option, message):
+    monkeypatch.setattr(sys, "argv", ["prog", "--load", str(tmp_path)] + option)
+    monkeypatch.setenv("MIGRATE_DATABASE_URL", "postgresql://example")
+    monkeypatch.setattr(psycopg2, "connect", lambda *a, **kw: pytest.fail("no connection"))
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+
+    with pytest.raises(SystemExit) as exc:
+        migrate.main()
+
+    assert exc.value.code == 2
+    assert message in lines[0]
+
+
+def test_load_directory_checksum_mismatch(tmp_path, monkeypatch):
+    manifest = extract_tables(_sqlite_db(), tmp_path, chunk_rows=10)
+    chunk_file = tmp_path / manifest["tables"][1]["chunks"][0]["file"]
+    chunk_file.write_bytes(gzip.compress(b"tampered\n"))
+    conn, _, copied = _mock_pg(monkeypatch)
+
+    with pytest.raises(RuntimeError, match="Checksum mismatch"):
+        load_directory("postgresql://example", tmp_path, jobs=1)
+    assert copied == []
+
+
+def test_load_chunk_rolls_back_on_error(tmp_path, monkeypatch):
+    manifest = extract_tables(_sqlite_db(), tmp_path, chunk_rows=10)
+    conn, cursor, _ = _mock_pg(monkeypatch)
+    cursor.copy_expert.side_effect = psycopg2.Error("bad row")
+    entry = manifest["tables"][1]
+
+    with pytest.raises(psycopg2.Error):
+        migrate.load_chunk(conn, tmp_path, entry, entry["chunks"][0])
+    conn.rollback.assert_called_once()
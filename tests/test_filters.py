@@ -0,0 +1,172 @@
+"""Test table, row and column filters"""
+
+import gzip
+import sqlite3
+from unittest.mock import MagicMock
+
+import pytest
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import (
+    TableFilter,
+    extract_tables,
+    migrate_table,
+    order_columns,
+    select_tables,
+    sqlite_row_counts,
+    sqlite_sorts,
+    stream_sqlite_rows,
+    table_filters,
+)
+
+
+def _sqlite():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE chat (id TEXT PRIMARY KEY, updated_at INTEGER, chat TEXT)")
+    conn.execute("CREATE TABLE chat_message (id TEXT, chat_id TEXT, content TEXT)")
+    conn.execute("CREATE TABLE chat_file (id TEXT, chat_id TEXT, file_id TEXT)")
+    conn.execute("CREATE TABLE file (id TEXT PRIMARY KEY)")
+    conn.executemany("INSERT INTO chat VALUES (?, ?, '{}')", [("old", 1), ("new", 9)])
+    conn.executemany(
+        "INSERT INTO chat_message VALUES (?, ?, 'x')",
+        [("m1", "old"), ("m2", "new"), ("m3", None)],
+    )
+    conn.executemany(
+        "INSERT INTO chat_file VALUES (?, ?, 'f')", [("f1", "old"), ("f2", "new")]
+    )
+    conn.execute("INSERT INTO file VALUES ('f')")
+    return conn
+
+
+def test_select_tables():
+    tables = ["user", "chat", "document", "file"]
+
+    assert select_tables(tables) == tables
+    assert select_tables(tables, exclude=["document"]) == ["user", "chat", "file"]
+    assert select_tables(tables, include=["file", "chat"], exclude=["file"]) == ["chat"]
+
+
+def test_table_filters_follow_dependencies():
+    conn = _sqlite()
+    tables = ["chat", "chat_message", "chat_file", "file"]
+
+    filters = table_filters(
+        conn, tables, {"chat": "updated_at > 5"}, {"chat": ["chat"]}
+    )
+
+    assert filters["chat"] == TableFilter("(updated_at > 5)", frozenset({"chat"}))
+    assert filters["file"] == TableFilter()
+    assert sqlite_row_counts(conn, tables, filters) == {
+        "chat": 1, "chat_message": 2, "chat_file": 1, "file": 1,
+    }
+    rows = stream_sqlite_rows(conn, "chat_message", ["id"], filters["chat_message"])
+    assert [r[0] for r in rows] == ["m2", "m3"]
+
+
+def test_table_filters_chatidtag_follows_chat():
+    conn = _sqlite()
+    conn.execute("CREATE TABLE chatidtag (id TEXT, tag_name TEXT, chat_id TEXT)")
+    conn.executemany("INSERT INTO chatidtag VALUES (?, 't', ?)", [("t1", "old"), ("t2", "new")])
+
+    filters = table_filters(conn, ["chat", "chatidtag"], {"chat": "updated_at > 5"})
+
+    assert sqlite_row_counts(conn, ["chatidtag"], filters) == {"chatidtag": 1}
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({"where": {"chats": "updated_at > 5"}}, "--where: no such SQLite table: chats"),
+    ({"exclude_columns": {"chat": ["chat"], "x": ["y"]}}, "--exclude-column: .* x"),
+    ({"order": {"chat_messages": "chat_id"}}, "--order: .* chat_messages"),
+])
+def test_table_filters_unknown_table(kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        table_filters(_sqlite(), ["chat"], **kwargs)
+
+
+def test_table_filter_columns():
+    schema = [(0, "id", "TEXT", 1, None, 1), (1, "chat", "TEXT", 0, None, 0)]
+
+    assert TableFilter().columns(schema) == ["id", "chat"]
+    assert TableFilter(exclude_columns=frozenset({"chat"})).columns(schema) == ["id"]
+
+
+def test_migrate_table_with_filter(monkeypatch):
+    monkeypatch.setattr(migrate, "pg_column_types", lambda conn, table, schema="public": {})
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    copied = []
+    cursor.copy_expert.side_effect = lambda sql, stream: copied.append(
+        (sql, stream.read(1 << 16))
+    )
+
+    migrate_table(
+        _sqlite(), pg_conn, "chat",
+        table_filter=TableFilter("updated_at > 5", frozenset({"chat"})),
+    )
+
+    assert copied == [
+        ("COPY chat (id, updated_at) FROM STDIN WITH CSV NULL '__NULL__'", "new,9\n")
+    ]
+
+
+def test_extract_tables_with_filters(tmp_path):
+    conn = _sqlite()
+    tables = ["chat", "chat_message"]
+    filters = table_filters(conn, tables, {"chat": "id = 'old'"}, {"chat_message": ["content"]})
+
+    manifest = extract_tables(conn, tmp_path, 100, tables=tables, filters=filters)
+
+    assert [(t["name"], t["columns"], t["rows"]) for t in manifest["tables"]] == [
+        ("chat", ["id", "updated_at", "chat"], 1),
+        ("chat_message", ["id", "chat_id"], 2),
+    ]
+    with gzip.open(tmp_path / "chat_message.00000.csv.gz", "rt") as f:
+        assert f.read() == "m1,old\nm3,__NULL__\n"
+
+
+def test_order_columns():
+    assert order_columns('user_id, "updated_at" DESC') == ["user_id", "updated_at"]
+
+
+def test_ordered_read_uses_index():
+    conn = _sqlite()
+    conn.execute("CREATE INDEX chat_updated ON chat (updated_at, id)")
+
+    filters = table_filters(conn, ["chat", "chat_message"], order={
+        "chat": "updated_at DESC", "chat_message": "chat_id",
+    })
+    sql = filters["chat"].select_sql("chat", ["id"])
+
+    assert sql == 'SELECT "id" FROM "chat" ORDER BY updated_at DESC'
+    assert not sqlite_sorts(conn, sql)
+    assert sqlite_sorts(conn, filters["chat_message"].select_sql("chat_message", ["id"]))
+    assert list(stream_sqlite_rows(conn, "chat", ["id"], filters["chat"])) == [("new",), ("old",)]
+
+
+def test_ordered_read_with_partial_index():
+    conn = _sqlite()
+    conn.execute("CREATE INDEX chat_recent ON chat (updated_at) WHERE updated_at > 5")
+
+    filters = table_filters(conn, ["chat"], order={"chat": "updated_at"})
+    sql = filters["chat"].select_sql("chat", ["id"])
+
+    assert sqlite_sorts(conn, sql)
+    assert list(stream_sqlite_rows(conn, "chat", ["id"], filters["chat"])) == [("old",), ("new",)]
+
+
+def test_migrate_table_reports_correlation(monkeypatch):
+    monkeypatch.setattr(migrate, "pg_column_types", lambda conn, table, schema="public": {})
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [("updated_at", 1.0), ("id", None)]
+
+    migrate_table(
+        _sqlite(), pg_conn, "chat", table_filter=TableFilter(order_by="updated_at, id"),
+    )
+
+    executed = [c[0][0] for c in cursor.execute.call_args_list]
+    assert "ANALYZE chat" in executed
+    assert any("SQLite sorts the table first" in line for line in lines)
+    assert "[dim]chat correlation: updated_at 1.00, id n/a[/]" in lines
@@ -0,0 +1,148 @@
+"""Test sequences and statistics after loading"""
+
+import sqlite3
+from unittest.mock import MagicMock
+
+import psycopg2
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import (
+    MigrationConfig,
+    Migrator,
+    TableFinalization,
+    finalize_table,
+    finalize_tables,
+    pg_owned_sequences,
+    print_finalization,
+)
+
+
+def _pg():
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    return pg_conn, cursor
+
+
+def test_pg_owned_sequences():
+    pg_conn, cursor = _pg()
+    cursor.fetchall.return_value = [("config", "id", "config_id_seq")]
+
+    sequences = pg_owned_sequences(pg_conn, ["config", "chat"], "acme")
+
+    assert sequences == {"config": [("id", "config_id_seq")], "chat": []}
+    assert cursor.execute.call_args[0][1] == ("acme", ["config", "chat"])
+
+
+def test_finalize_table():
+    pg_conn, cursor = _pg()
+    cursor.fetchone.return_value = (1201,)
+
+    result = finalize_table(pg_conn, "user", [("id", "user_id_seq")])
+
+    setval, analyze = [c[0] for c in cursor.execute.call_args_list]
+    assert 'MAX(id) + 1, 1) FROM "user"' in setval[0]
+    assert setval[1] == ("user_id_seq", "user_id_seq")
+    assert analyze == ('ANALYZE "user"',)
+    assert result.sequences == {"user_id_seq": 1201}
+    assert not result.vacuumed
+
+
+def test_finalize_table_vacuum():
+    pg_conn, cursor = _pg()
+
+    result = finalize_table(pg_conn, "chat", [], vacuum=True)
+
+    cursor.execute.assert_called_once_with("VACUUM (FREEZE, ANALYZE) chat")
+    assert result.vacuumed
+
+
+def _pool_connect(monkeypatch, cursor):
+    """Patch psycopg2.connect with a new connection per call, all sharing `cursor`.
+
+    The pool keys connections by id(), so it must not get the same one twice.
+    """
+    conns = []
+
+    def connect(*args, **kwargs):
+        conn = MagicMock()
+        conn.cursor.return_value.__enter__.return_value = cursor
+        conns.append(conn)
+        return conn
+
+    monkeypatch.setattr(psycopg2, "connect", connect)
+    return conns
+
+
+def test_finalize_tables(monkeypatch):
+    _, cursor = _pg()
+    cursor.fetchall.return_value = []
+    conns = _pool_connect(monkeypatch, cursor)
+
+    results = finalize_tables(
+        "postgresql://pg", ["chat", "tag"], {"chat": 5000, "tag": 3}, "acme",
+        jobs=2, vacuum_freeze_rows=1000,
+    )
+
+    assert [(r.table, r.vacuumed) for r in results] == [("chat", True), ("tag", False)]
+    assert all(conn.autocommit is True for conn in conns[1:])
+    cursor.execute.assert_any_call("SET search_path TO acme")
+    cursor.execute.assert_any_call("VACUUM (FREEZE, ANALYZE) chat")
+    cursor.execute.assert_any_call("ANALYZE tag")
+    assert finalize_tables("postgresql://pg", [], {}) == []
+
+
+def test_print_finalization(monkeypatch):
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+
+    print_finalization([
+        TableFinalization("config", {"config_id_seq": 12}, seconds=0.1),
+        TableFinalization("chat", vacuumed=True, seconds=2.0),
+    ], 2.0)
+
+    assert lines[0].row_count == 3
+    assert list(lines[0].columns[1].cells)[0] == "config_id_seq → 12"
+    assert list(lines[0].columns[2].cells)[1] == "VACUUM (FREEZE, ANALYZE)"
+
+
+def test_migrator_run_finalizes(tmp_path, monkeypatch):
+    path = tmp_path / "webui.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE config (id INTEGER PRIMARY KEY, data TEXT)")
+    conn.executemany("INSERT INTO config VALUES (?, '{}')", [(i,) for i in range(3)])
+    conn.commit()
+    conn.close()
+    _, cursor = _pg()
+    cursor.fetchall.return_value = []
+    cursor.copy_expert.side_effect = lambda sql, stream: stream.read(8192)
+    _pool_connect(monkeypatch, cursor)
+
+    result = Migrator(MigrationConfig(path, "postgresql://pg")).run()
+
+    assert [r.table for r in result.finalized] == ["config"]
+    cursor.execute.assert_any_call("ANALYZE config")
+
+    result = Migrator(MigrationConfig(path, "postgresql://pg", finalize=False)).run()
+
+    assert result.finalized == []
+
+
+def test_tenants_finalize_in_their_schema(tmp_path, monkeypatch):
+    path = tmp_path / "acme.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE config (id INTEGER PRIMARY KEY, data TEXT)")
+    conn.commit()
+    conn.close()
+    _, cursor = _pg()
+    cursor.fetchall.return_value = []
+    cursor.copy_expert.side_effect = lambda sql, stream: stream.read(8192)
+    _pool_connect(monkeypatch, cursor)
+    tenant = migrate.Tenant("acme", path, "postgresql://pg", "acme")
+
+    result, = migrate.migrate_tenants(
+        [tenant], MigrationConfig(None, None, jobs=4), max_connections=1
+    )
+
+    assert result.error is None
+    assert cursor.execute.call_args_list[-2][0] == ("SET search_path TO acme",)
+    cursor.execute.assert_called_with("ANALYZE config")
@@ -0,0 +1,102 @@
+"""Test staging-table merge load mode"""
+
+import sqlite3
+from unittest.mock import MagicMock
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import (
+    MergeResult,
+    create_staging_table,
+    merge_staging_table,
+    pg_primary_key,
+)
+
+
+def _pg():
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    return pg_conn, cursor
+
+
+def test_pg_primary_key():
+    pg_conn, cursor = _pg()
+    cursor.fetchall.return_value = [("id",), ("user_id",)]
+
+    assert pg_primary_key(pg_conn, "user", "acme") == ["id", "user_id"]
+    sql, params = cursor.execute.call_args.args
+    assert "indisprimary" in sql
+    assert params == ('acme."user"',)
+
+
+def test_create_staging_table():
+    pg_conn, cursor = _pg()
+
+    assert create_staging_table(pg_conn, "user") == "_migrate_stage_user"
+    assert [c.args[0] for c in cursor.execute.call_args_list] == [
+        "DROP TABLE IF EXISTS _migrate_stage_user",
+        'CREATE UNLOGGED TABLE _migrate_stage_user (LIKE "user")',
+        "ALTER TABLE _migrate_stage_user ADD COLUMN _migrate_seq bigserial",
+    ]
+
+
+def test_merge_staging_table_in_batches():
+    pg_conn, cursor = _pg()
+    # Sequence values up to 12, with gaps left by failed COPY attempts.
+    cursor.fetchone.side_effect = [(12,), (3, 1, 1), (1, 0, 1), (0, 0, 0)]
+    after_batch = MagicMock()
+
+    result = merge_staging_table(
+        pg_conn, "chat", "_migrate_stage_chat", ["id", "title", "chat"], ["id"],
+        batch_rows=5, after_batch=after_batch,
+    )
+
+    assert result == MergeResult(inserted=1, updated=2, unchanged=1)
+    assert after_batch.call_count == 3
+    merges = [c for c in cursor.execute.call_args_list if "ON CONFLICT" in c.args[0]]
+    assert [c.args[1] for c in merges] == [(0, 5), (5, 10), (10, 12)]
+    sql = merges[0].args[0]
+    assert "INSERT INTO chat AS t (id, title, chat)" in sql
+    assert "ON CONFLICT (id) DO UPDATE SET title = EXCLUDED.title, chat = EXCLUDED.chat" in sql
+    assert "IS DISTINCT FROM" in sql
+    cursor.execute.assert_called_with("DROP TABLE _migrate_stage_chat")
+
+
+def test_merge_staging_table_only_key_columns():
+    pg_conn, cursor = _pg()
+    cursor.fetchone.side_effect = [(2,), (2, 1, 0)]
+
+    result = merge_staging_table(pg_conn, "tag", "_migrate_stage_tag", ["id"], ["id"])
+
+    assert result == MergeResult(inserted=1, updated=0, unchanged=1)
+    assert any("DO NOTHING" in c.args[0] for c in cursor.execute.call_args_list)
+
+
+def _sqlite():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE chat (id TEXT PRIMARY KEY, title TEXT)")
+    conn.execute("INSERT INTO chat VALUES ('1', 'hello')")
+    return conn
+
+
+def test_migrate_table_merge(monkeypatch):
+    monkeypatch.setattr(migrate, "pg_column_types", lambda conn, table, schema="public": {})
+    monkeypatch.setattr(migrate, "pg_primary_key", lambda conn, table, schema="public": ["id"])
+    pg_conn, cursor = _pg()
+    cursor.fetchone.side_effect = [(1,), (1, 0, 1)]
+
+    result = migrate.migrate_table(_sqlite(), pg_conn, "chat", load_mode="merge")
+
+    assert result == MergeResult(inserted=0, updated=1, unchanged=0)
+    statements = [c.args[0] for c in cursor.execute.call_args_list]
+    assert not any(s.startswith("TRUNCATE") for s in statements)
+    assert cursor.copy_expert.call_args.args[0].startswith("COPY _migrate_stage_chat (id, title)")
+    pg_conn.commit.assert_called_once()
+
+
+def test_migrate_table_merge_without_primary_key(monkeypatch):
+    monkeypatch.setattr(migrate, "pg_column_types", lambda conn, table, schema="public": {})
+    monkeypatch.setattr(migrate, "pg_primary_key", lambda conn, table, schema="public": [])
+    pg_conn, cursor = _pg()
+
+    assert migrate.migrate_table(_sqlite(), pg_conn, "chat", load_mode="merge") is None
+    cursor.execute.assert_called_once_with("TRUNCATE TABLE chat CASCADE")
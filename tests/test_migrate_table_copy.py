@@ -6,8 +6,6 @@ from open_webui_sqlite_migration import migrate
 
 
 def test_migrate_table_copy_full_path(monkeypatch):
-    monkeypatch.setattr(migrate, "DRY_RUN", False)
-
     # SQLite setup
     sqlite_conn = sqlite3.connect(":memory:")
     sqlite_conn.execute("""
@@ -41,7 +39,7 @@ def test_migrate_table_copy_full_path(monkeypatch):
     monkeypatch.setattr(
         migrate,
         "pg_column_types",
-        lambda conn, table: {"payload": "jsonb"}
+        lambda conn, table, schema="public": {"payload": "jsonb"}
     )
 
     migrate.migrate_table(sqlite_conn, pg_conn, "test")
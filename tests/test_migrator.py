@@ -0,0 +1,314 @@
+"""Test the importable Migrator API"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import (
+    CallbackProgressReporter,
+    MigrationConfig,
+    Migrator,
+    TableMetrics,
+)
+
+
+def test_import_is_lazy():
+    env = {k: v for k, v in os.environ.items()
+           if k not in {"SQLITE_DB_PATH", "MIGRATE_DATABASE_URL"}}
+    code = (
+        "import sys; import open_webui_sqlite_migration.migrate; "
+        "print(*(m in sys.modules for m in ('rich.console', 'psycopg2._psycopg', "
+        "'asyncio')))"
+    )
+
+    out = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+
+    assert out.stdout.split() == ["False", "False", "False"]
+
+
+def test_config_from_env(monkeypatch):
+    monkeypatch.setenv("SQLITE_DB_PATH", "/data/webui.db")
+    monkeypatch.setenv("MIGRATE_DATABASE_URL", "postgresql://pg")
+
+    config = MigrationConfig.from_env(chunk_rows=10)
+
+    assert config.sqlite_path == migrate.Path("/data/webui.db")
+    assert config.database_url == "postgresql://pg"
+    assert config.chunk_rows == 10
+
+
+def test_config_from_env_missing(monkeypatch):
+    monkeypatch.delenv("SQLITE_DB_PATH", raising=False)
+
+    with pytest.raises(RuntimeError, match="SQLITE_DB_PATH"):
+        MigrationConfig.from_env()
+
+
+def test_config_from_env_only_needed(monkeypatch):
+    monkeypatch.setenv("SQLITE_DB_PATH", "/data/webui.db")
+    monkeypatch.delenv("MIGRATE_DATABASE_URL", raising=False)
+
+    config = MigrationConfig.from_env(postgres=False)
+
+    assert config.sqlite_path == migrate.Path("/data/webui.db")
+    assert config.database_url is None
+    with pytest.raises(RuntimeError, match="MIGRATE_DATABASE_URL"):
+        MigrationConfig.from_env()
+
+    monkeypatch.delenv("SQLITE_DB_PATH")
+    monkeypatch.setenv("MIGRATE_DATABASE_URL", "postgresql://pg")
+    assert MigrationConfig.from_env(sqlite=False).sqlite_path is None
+
+
+def test_callback_progress_reporter():
+    now = [0.0]
+    calls = []
+    metrics = []
+    inner = MagicMock()
+    reporter = CallbackProgressReporter(
+        inner, lambda *a: calls.append(a), metrics.append, clock=lambda: now[0]
+    )
+
+    with reporter:
+        reporter.start_table("chat", 10)
+        reporter.advance("chat", 4, 100)
+        reporter.advance("chat", 6, 150)
+        now[0] = 2.0
+        reporter.finish_table("chat")
+
+    assert calls == [("chat", 4, 100), ("chat", 6, 150)]
+    assert metrics == reporter.metrics == [TableMetrics("chat", 10, 250, 2.0)]
+    inner.advance.assert_called_with("chat", 6, 150)
+    inner.finish_table.assert_called_once_with("chat")
+    inner.__exit__.assert_called_once()
+
+
+@pytest.fixture
+def sqlite_file(tmp_path):
+    path = tmp_path / "webui.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE tag (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("CREATE TABLE chat (id INTEGER PRIMARY KEY, title TEXT)")
+    conn.executemany("INSERT INTO tag VALUES (?, 't')", [(i,) for i in range(3)])
+    conn.executemany("INSERT INTO chat VALUES (?, 'c')", [(i,) for i in range(5)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _pg(monkeypatch):
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = []
+
+    def copy_expert(sql, stream):
+        while stream.read(8192):
+            pass
+
+    cursor.copy_expert.side_effect = copy_expert
+    monkeypatch.setattr(migrate.psycopg2, "connect", lambda url: pg_conn)
+    return pg_conn
+
+
+def test_migrator_run(sqlite_file, monkeypatch):
+    pg_conn = _pg(monkeypatch)
+    progress = []
+    metrics = []
+    migrator = Migrator(
+        MigrationConfig(sqlite_file, "postgresql://pg", small_table_rows=0),
+        on_progress=lambda table, rows, nbytes: progress.append((table, rows)),
+        on_metrics=metrics.append,
+    )
+
+    result = migrator.run()
+
+    assert [(m.table, m.rows) for m in result.tables] == [("tag", 3), ("chat", 5)]
+    assert metrics == result.tables
+    assert sum(rows for table, rows in progress if table == "chat") == 5
+    assert result.commits.count == 2
+    pg_conn.close.assert_called()
+
+
+def test_migrator_run_dry_run(sqlite_file, monkeypatch):
+    pg_conn = _pg(monkeypatch)
+
+    result = Migrator(MigrationConfig(sqlite_file, "postgresql://pg", dry_run="plan")).run()
+
+    assert [(m.table, m.rows) for m in result.tables] == [("tag", 0), ("chat", 0)]
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    cursor.copy_expert.assert_not_called()
+    pg_conn.commit.assert_not_called()
+
+
+def test_migrator_validate(sqlite_file, monkeypatch):
+    pg_conn = _pg(monkeypatch)
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [("chat",), ("user",)]
+    cursor.fetchone.return_value = (5,)
+
+    counts = Migrator(MigrationConfig(sqlite_file, "postgresql://pg")).validate()
+
+    assert counts == {"chat": (5, 5), "tag": (3, 0), "user": (0, 5)}
+
+
+def test_migrator_run_measure_merge_and_rejects(sqlite_file, tmp_path, monkeypatch):
+    _pg(monkeypatch)
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(str(msg)))
+
+    result = Migrator(MigrationConfig(
+        sqlite_file, "postgresql://pg", dry_run="measure", sample_rows=2,
+    )).run()
+
+    assert [(m.table, m.sampled_rows) for m in result.measurements] == [("tag", 2), ("chat", 2)]
+
+    result = Migrator(MigrationConfig(
+        sqlite_file, "postgresql://pg", load_mode="merge", transaction="atomic",
+        reject_file=tmp_path / "rejects.jsonl",
+    )).run()
+
+    assert result.commits.count == 1
+    assert result.rejected == 0
+    assert any("Merge total" in line for line in lines)
+
+
+def test_migrator_run_failure_rolls_back(sqlite_file, tmp_path, monkeypatch):
+    pg_conn = _pg(monkeypatch)
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    cursor.copy_expert.side_effect = RuntimeError("boom")
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(str(msg)))
+
+    with pytest.raises(RuntimeError, match="boom"):
+        Migrator(MigrationConfig(
+            sqlite_file, "postgresql://pg", transaction="atomic",
+            reject_file=tmp_path / "rejects.jsonl",
+        )).run()
+
+    pg_conn.rollback.assert_called()
+    pg_conn.close.assert_called()
+    assert any("nothing was committed" in line for line in lines)
+
+
+def test_migrator_pg_schema(sqlite_file, monkeypatch):
+    pg_conn = _pg(monkeypatch)
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    budget = migrate.ConnectionBudget(2)
+    migrator = Migrator(
+        MigrationConfig(sqlite_file, "postgresql://pg", pg_schema="acme", finalize=False),
+        budget=budget,
+    )
+
+    migrator.run()
+
+    cursor.execute.assert_any_call("SET search_path TO acme")
+    assert budget._free == 2  # pylint: disable=protected-access
+
+    cursor.fetchall.return_value = [("chat",)]
+    cursor.fetchone.return_value = (5,)
+    assert migrator.postgres_counts() == {"chat": 5}
+    assert cursor.execute.call_args_list[-2][0][1] == ("acme",)
+
+
+def test_migrator_lowers_async_streams_to_budget(sqlite_file, monkeypatch):
+    _pg(monkeypatch)
+    streams = []
+    monkeypatch.setattr(
+        migrate, "async_migrate",
+        lambda url, path, tables, counts, max_streams, *a, **kw: streams.append(max_streams),
+    )
+    config = MigrationConfig(
+        sqlite_file, "postgresql://pg", engine="async", max_streams=4, finalize=False,
+    )
+
+    Migrator(config, budget=migrate.ConnectionBudget(3)).run()
+    Migrator(config).run()
+
+    assert streams == [2, 4]
+    with pytest.raises(ValueError, match="--max-connections 1 is too low"):
+        Migrator(config, budget=migrate.ConnectionBudget(1)).run()
+
+
+def test_migrator_run_releases_budget_on_failure(sqlite_file, monkeypatch):
+    def refuse(url):
+        raise RuntimeError("refused")
+
+    monkeypatch.setattr(migrate.psycopg2, "connect", refuse)
+    budget = migrate.ConnectionBudget(1)
+
+    with pytest.raises(RuntimeError, match="refused"):
+        Migrator(MigrationConfig(sqlite_file, "postgresql://pg"), budget=budget).run()
+
+    assert budget._free == 1  # pylint: disable=protected-access
+
+
+def test_migrator_sqlite_estimates(sqlite_file):
+    conn = sqlite3.connect(sqlite_file)
+    conn.execute("ANALYZE")
+    conn.close()
+
+    counts = Migrator(MigrationConfig(sqlite_file, "postgresql://pg")).sqlite_counts(estimate=True)
+
+    assert counts["chat"] == 5
+
+
+def test_print_row_counts_and_validation(monkeypatch):
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+
+    migrate.print_row_counts("Counts", {"chat": 5, "tag": -1})
+    mismatches = migrate.print_validation({"chat": (5, 5), "tag": (3, 0), "user": (-1, 2)})
+
+    assert lines[0].row_count == 3
+    assert mismatches == ["tag"]
+    assert "Mismatches found in:[/] tag" in lines[-1]
+    migrate.print_validation({"chat": (5, 5)})
+    assert lines[-1] == "[green]All tables match![/]"
+
+
+def test_migrator_filters(sqlite_file, monkeypatch):
+    pg_conn = _pg(monkeypatch)
+    config = MigrationConfig(
+        sqlite_file, "postgresql://pg", exclude=["tag"], where={"chat": "id < 2"},
+        exclude_columns={"chat": ["title"]}, order={"chat": "id DESC"},
+    )
+
+    result = Migrator(config).run()
+
+    assert [(m.table, m.rows) for m in result.tables] == [("chat", 2)]
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    assert cursor.copy_expert.call_args[0][0].startswith("COPY chat (id) FROM")
+
+    cursor.fetchall.return_value = [("chat",), ("tag",)]
+    cursor.fetchone.return_value = (2,)
+    assert Migrator(config).validate() == {"chat": (2, 2)}
+
+
+def test_migrator_check_filters(sqlite_file):
+    Migrator(MigrationConfig(sqlite_file, None)).check_filters()
+    Migrator(MigrationConfig(sqlite_file, None, where={"chat": "id < 2"})).check_filters()
+
+    with pytest.raises(ValueError, match="--where: no such SQLite table: chats"):
+        Migrator(MigrationConfig(sqlite_file, None, where={"chats": "id < 2"})).check_filters()
+
+
+def test_config_check_async_engine(sqlite_file):
+    MigrationConfig(sqlite_file, "postgresql://pg", engine="async").check()
+    config = MigrationConfig(
+        sqlite_file, "postgresql://pg", engine="async", transaction="atomic",
+        reject_file=sqlite_file.with_name("rejects.jsonl"), small_table_rows=10,
+        load_mode="merge",
+    )
+
+    with pytest.raises(ValueError, match=(
+        "--engine async does not support --transaction atomic, --reject-file, "
+        "--small-table-rows, --load-mode merge"
+    )):
+        Migrator(config).run()
@@ -1,6 +1,7 @@
 """Test parse arguments"""
 
 import sys
+import pytest
 from open_webui_sqlite_migration.migrate import parse_args
 
 def test_parse_args_default(monkeypatch):
@@ -14,7 +15,13 @@ def test_parse_args_default(monkeypatch):
 def test_parse_args_dry_run(monkeypatch):
     monkeypatch.setattr(sys, "argv", ["prog", "--dry-run"])
     args = parse_args()
-    assert args.dry_run is True
+    assert args.dry_run == "plan"
+
+def test_parse_args_dry_run_measure(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--dry-run=measure", "--sample-rows", "100"])
+    args = parse_args()
+    assert args.dry_run == "measure"
+    assert args.sample_rows == 100
 
 def test_parse_args_sqlite_counts(monkeypatch):
     monkeypatch.setattr(sys, "argv", ["prog", "--sqlite-counts"])
@@ -38,3 +45,110 @@ def test_parse_args_ignores_unknown_args(monkeypatch):
     except SystemExit:
         pass
     assert True
+
+def test_parse_args_progress(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--progress", "log", "--progress-interval", "30"])
+    args = parse_args()
+    assert args.progress == "log"
+    assert args.progress_interval == 30.0
+
+def test_parse_args_extract_load(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--extract", "/tmp/out", "--chunk-rows", "10"])
+    args = parse_args()
+    assert str(args.extract) == "/tmp/out"
+    assert args.chunk_rows == 10
+    assert args.load is None
+    assert args.jobs == 4
+
+def test_parse_args_load_shard(monkeypatch):
+    monkeypatch.setattr(sys, "argv", [
+        "prog", "--load", "/tmp/out", "--load-shard", "2/3", "--load-step", "copy",
+    ])
+    args = parse_args()
+    assert args.load_shard == (2, 3)
+    assert args.load_step == ["copy"]
+
+    for value in ("3/2", "0/2", "x/2", "2"):
+        monkeypatch.setattr(sys, "argv", ["prog", "--load-shard", value])
+        with pytest.raises(SystemExit):
+            parse_args()
+
+def test_parse_args_tenants(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--tenants", "t.json", "--max-parallel", "8"])
+    args = parse_args()
+    assert str(args.tenants) == "t.json"
+    assert args.max_parallel == 8
+    assert args.max_connections is None
+
+def test_parse_args_engine(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--engine", "async", "--max-streams", "16"])
+    args = parse_args()
+    assert args.engine == "async"
+    assert args.max_streams == 16
+
+def test_parse_args_reject_file(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--reject-file", "rejects.jsonl"])
+    args = parse_args()
+    assert str(args.reject_file) == "rejects.jsonl"
+
+def test_parse_args_transaction(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog"])
+    assert parse_args().transaction == "per-table"
+    monkeypatch.setattr(sys, "argv", ["prog", "--transaction", "atomic"])
+    assert parse_args().transaction == "atomic"
+
+def test_parse_args_load_mode(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--load-mode", "merge"])
+    assert parse_args().load_mode == "merge"
+
+def test_parse_args_small_table_rows(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--small-table-rows", "0"])
+    assert parse_args().small_table_rows == 0
+    monkeypatch.setattr(sys, "argv", ["prog"])
+    assert parse_args().small_table_rows is None
+
+def test_parse_args_estimate(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--sqlite-counts", "--estimate", "--jobs", "8"])
+    args = parse_args()
+    assert args.estimate is True
+    assert args.jobs == 8
+
+def test_parse_args_filters(monkeypatch):
+    monkeypatch.setattr(sys, "argv", [
+        "prog", "--include", "chat,chat_message", "--include", "user",
+        "--exclude", "document", "--where", "chat:updated_at >= 1700000000",
+        "--exclude-column", "chat.chat", "--order", "chat:user_id, updated_at",
+    ])
+    args = parse_args()
+    assert args.include == ["chat", "chat_message", "user"]
+    assert args.exclude == ["document"]
+    assert args.where == [("chat", "updated_at >= 1700000000")]
+    assert args.exclude_column == [("chat", "chat")]
+    assert args.order == [("chat", "user_id, updated_at")]
+
+def test_parse_args_bad_where(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--where", "chat"])
+    with pytest.raises(SystemExit):
+        parse_args()
+    monkeypatch.setattr(sys, "argv", ["prog", "--exclude-column", "chat"])
+    with pytest.raises(SystemExit):
+        parse_args()
+
+def test_parse_args_compact_json(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--compact-json"])
+    args = parse_args()
+    assert args.compact_json is True
+
+def test_parse_args_throttle(monkeypatch):
+    monkeypatch.setattr(sys, "argv", [
+        "prog", "--max-rate", "20", "--throttle-on", "replication-lag",
+        "--throttle-target", "5",
+    ])
+    args = parse_args()
+    assert (args.max_rate, args.throttle_on, args.throttle_target) == (20.0, "replication-lag", 5.0)
+
+def test_parse_args_finalize(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["prog", "--skip-finalize", "--vacuum-freeze-rows", "100000"])
+    args = parse_args()
+    assert args.skip_finalize is True
+    assert args.vacuum_freeze_rows == 100000
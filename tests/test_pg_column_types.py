@@ -26,7 +26,7 @@ def test_pg_column_types_executes_query_and_returns_dict():
 
     sql, params = mock_cursor.execute.call_args.args
     assert "information_schema.columns" in sql
-    assert params == ("test_table",)
+    assert params == ("public", "test_table")
 
     assert result == {
         "id": "integer",
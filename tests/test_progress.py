@@ -0,0 +1,111 @@
+"""Test row-level progress reporting"""
+
+import sqlite3
+from unittest.mock import MagicMock
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import (
+    CopyStream,
+    LogProgressReporter,
+    NullProgressReporter,
+    RichProgressReporter,
+    format_eta,
+    make_progress_reporter,
+)
+
+
+def test_copy_stream_reports_rows_and_bytes():
+    reports = []
+    stream = CopyStream(
+        iter([(1, "a"), (2, "b"), (3, "c")]),
+        on_progress=lambda rows, nbytes: reports.append((rows, nbytes)),
+    )
+    data = ""
+    while True:
+        chunk = stream.read(4)
+        if not chunk:
+            break
+        data += chunk
+
+    assert sum(r for r, _ in reports) == 3
+    assert sum(b for _, b in reports) == len(data)
+
+
+def test_copy_stream_without_callback():
+    stream = CopyStream(iter([(1,)]))
+    assert stream.read(1024) == "1\n"
+
+
+def test_format_eta():
+    assert format_eta(None) == "-:--:--"
+    assert format_eta(3725) == "1:02:05"
+
+
+def test_log_progress_reporter_logs_periodically(monkeypatch):
+    now = [0.0]
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+
+    reporter = LogProgressReporter(100, 1, interval=10, clock=lambda: now[0])
+    with reporter:
+        reporter.start_table("chat", 100)
+        now[0] = 5
+        reporter.advance("chat", 10, 1000)
+        assert lines == []
+
+        now[0] = 10
+        reporter.advance("chat", 40, 4_000_000)
+        assert any("chat: 50/100 rows (50.0%)" in line for line in lines)
+        assert any("overall (0/1 tables)" in line for line in lines)
+        assert any("0.4 MB/s" in line and "ETA 0:00:10" in line for line in lines)
+
+        reporter.advance("chat", 50, 10)
+        reporter.finish_table("chat")
+
+    assert any("chat done: 100/100" in line for line in lines)
+    assert any("overall (1/1 tables): 100/100" in line for line in lines)
+
+
+def test_rich_progress_reporter_tracks_tables():
+    reporter = RichProgressReporter(total_rows=10, total_tables=1)
+    with reporter:
+        reporter.start_table("chat", 10)
+        reporter.advance("chat", 10, 500)
+        overall = reporter._progress.tasks[0]
+        assert overall.completed == 10
+        assert overall.fields["bytes"] == 500
+        reporter.finish_table("chat")
+    assert "1/1 tables" in reporter._progress.tasks[0].description
+
+
+def test_make_progress_reporter_modes(monkeypatch):
+    counts = {"a": 1, "b": -1}
+    assert isinstance(make_progress_reporter("none", counts), NullProgressReporter)
+    assert isinstance(make_progress_reporter("log", counts), LogProgressReporter)
+    assert isinstance(make_progress_reporter("bar", counts), RichProgressReporter)
+    monkeypatch.setattr(type(migrate.console.get()), "is_terminal", property(lambda self: False))
+    assert isinstance(make_progress_reporter("auto", counts), LogProgressReporter)
+
+
+def test_migrate_table_reports_progress(monkeypatch):
+    monkeypatch.setattr(migrate, "pg_column_types", lambda conn, table, schema="public": {})
+
+    sqlite_conn = sqlite3.connect(":memory:")
+    sqlite_conn.execute("CREATE TABLE test (id INTEGER)")
+    sqlite_conn.executemany("INSERT INTO test VALUES (?)", [(i,) for i in range(5)])
+
+    pg_conn = MagicMock()
+    pg_cursor = pg_conn.cursor.return_value.__enter__.return_value
+
+    def fake_copy_expert(sql, stream):
+        while stream.read(2):
+            pass
+
+    pg_cursor.copy_expert.side_effect = fake_copy_expert
+
+    progress = MagicMock()
+    migrate.migrate_table(sqlite_conn, pg_conn, "test", progress=progress, sqlite_count=5)
+
+    progress.start_table.assert_called_once_with("test", 5)
+    progress.finish_table.assert_called_once_with("test")
+    assert sum(c.args[1] for c in progress.advance.call_args_list) == 5
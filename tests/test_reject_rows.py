@@ -0,0 +1,99 @@
+"""Test bad-row quarantine with batch bisection"""
+
+import json
+import sqlite3
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import RejectWriter, chunked, copy_chunk
+
+
+def _pg_rejecting(bad_marker="BAD", error=psycopg2.DataError):
+    """Mock Postgres that fails any COPY containing `bad_marker`."""
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    loaded = []
+    attempts = []
+
+    def fake_copy_expert(sql, stream):
+        data = ""
+        while chunk := stream.read(8192):
+            data += chunk
+        attempts.append(data)
+        if bad_marker in data:
+            raise error("invalid byte sequence for encoding \"UTF8\": 0x00\n")
+        loaded.extend(data.splitlines())
+
+    cursor.copy_expert.side_effect = fake_copy_expert
+    return pg_conn, cursor, loaded, attempts
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert not list(chunked([], 2))
+
+
+def test_copy_chunk_without_errors(tmp_path):
+    pg_conn, cursor, loaded, _ = _pg_rejecting()
+    rejects = RejectWriter(tmp_path / "rejects.jsonl")
+
+    assert copy_chunk(pg_conn, "t", ["id"], [(1,), (2,)], ["id"], rejects) == 2
+
+    assert loaded == ["1", "2"]
+    cursor.execute.assert_any_call("SAVEPOINT migrate_chunk")
+    cursor.execute.assert_any_call("RELEASE SAVEPOINT migrate_chunk")
+    assert not rejects.path.exists()
+
+
+def test_copy_chunk_bisects_to_bad_rows(tmp_path):
+    pg_conn, cursor, loaded, attempts = _pg_rejecting()
+    rejects = RejectWriter(tmp_path / "rejects.jsonl")
+    rows = [(i, "BAD" if i in (3, 6) else "ok") for i in range(8)]
+
+    assert copy_chunk(pg_conn, "chat", ["id", "title"], rows, ["id"], rejects, "t1/chat") == 6
+    rejects.close()
+
+    assert sorted(int(line.split(",")[0]) for line in loaded) == [0, 1, 2, 4, 5, 7]
+    assert len(attempts) < 2 * len(rows)
+    cursor.execute.assert_any_call("ROLLBACK TO SAVEPOINT migrate_chunk")
+    executed = [c[0][0] for c in cursor.execute.call_args_list]
+    assert executed.count("SAVEPOINT migrate_chunk") == executed.count(
+        "RELEASE SAVEPOINT migrate_chunk"
+    )
+    records = [json.loads(line) for line in rejects.path.read_text().splitlines()]
+    assert [r["pk"] for r in records] == [{"id": 3}, {"id": 6}]
+    assert records[0]["table"] == "t1/chat"
+    assert "0x00" in records[0]["error"]
+    assert rejects.count == 2
+
+
+def test_copy_chunk_reraises_other_errors(tmp_path):
+    pg_conn, _, _, _ = _pg_rejecting(error=psycopg2.OperationalError)
+    rejects = RejectWriter(tmp_path / "rejects.jsonl")
+
+    with pytest.raises(psycopg2.OperationalError):
+        copy_chunk(pg_conn, "t", ["id"], [("BAD",)], ["id"], rejects)
+
+
+def test_migrate_table_with_rejects(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrate, "pg_column_types", lambda conn, table, schema="public": {})
+    sqlite_conn = sqlite3.connect(":memory:")
+    sqlite_conn.execute("CREATE TABLE message (channel TEXT, id TEXT, content TEXT, "
+                        "PRIMARY KEY (id, channel))")
+    sqlite_conn.executemany(
+        "INSERT INTO message VALUES (?, ?, ?)",
+        [("c", str(i), "BAD" if i == 4 else "hi") for i in range(10)],
+    )
+    pg_conn, _, loaded, _ = _pg_rejecting()
+    rejects = RejectWriter(tmp_path / "rejects.jsonl")
+
+    migrate.migrate_table(sqlite_conn, pg_conn, "message", rejects=rejects, chunk_rows=3)
+    rejects.close()
+
+    assert len(loaded) == 9
+    record = json.loads(rejects.path.read_text())
+    assert record == {"table": "message", "pk": {"id": "4", "channel": "c"},
+                      "error": record["error"]}
@@ -3,12 +3,32 @@
 import sqlite3
 from unittest.mock import MagicMock
 
+import pytest
+
 from open_webui_sqlite_migration.migrate import (
+    SQLITE_READ_CACHE_KIB,
+    open_sqlite_readonly,
+    open_sqlite_snapshot,
     sqlite_row_counts,
+    sqlite_row_counts_parallel,
+    sqlite_row_estimates,
     postgres_row_counts,
 )
 
 
+@pytest.fixture
+def sqlite_file(tmp_path):
+    path = tmp_path / "webui.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("CREATE TABLE posts (id INTEGER PRIMARY KEY, content TEXT)")
+    conn.executemany("INSERT INTO users VALUES (?, 'u')", [(i,) for i in range(5)])
+    conn.executemany("INSERT INTO posts VALUES (?, 'p')", [(i,) for i in range(7)])
+    conn.commit()
+    conn.close()
+    return path
+
+
 def test_sqlite_row_counts():
     conn = sqlite3.connect(":memory:")
     conn.execute("CREATE TABLE users (id INTEGER, name TEXT)")
@@ -56,3 +76,50 @@ def test_postgres_row_counts_handles_error():
     counts = postgres_row_counts(mock_conn, ["users"])
 
     assert counts["users"] == -1
+
+
+def test_open_sqlite_readonly(sqlite_file):
+    conn = open_sqlite_readonly(sqlite_file)
+
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 5
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("INSERT INTO users VALUES (99, 'x')")
+    conn.close()
+
+
+def test_open_sqlite_snapshot_bulk_read_profile(sqlite_file):
+    for conn in (open_sqlite_snapshot(sqlite_file), open_sqlite_readonly(sqlite_file)):
+        pragmas = {
+            name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+            for name in ("mmap_size", "cache_size", "temp_store", "query_only")
+        }
+
+        # SQLite caps mmap_size at its compile-time SQLITE_MAX_MMAP_SIZE.
+        assert pragmas["mmap_size"] > 0
+        assert pragmas["cache_size"] == -SQLITE_READ_CACHE_KIB
+        assert pragmas["temp_store"] == 2
+        assert pragmas["query_only"] == 1
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            conn.execute("DELETE FROM users")
+        conn.close()
+
+
+def test_sqlite_row_counts_parallel(sqlite_file):
+    counts = sqlite_row_counts_parallel(sqlite_file, ["users", "posts", "missing"], jobs=2)
+
+    assert counts == {"users": 5, "posts": 7, "missing": -1}
+    assert list(counts) == ["users", "posts", "missing"]
+
+
+def test_sqlite_row_estimates(sqlite_file):
+    conn = sqlite3.connect(sqlite_file)
+    conn.execute("CREATE INDEX posts_content ON posts (content)")
+    conn.execute("ANALYZE posts")
+
+    assert sqlite_row_estimates(conn, ["users", "posts"]) == {"users": -1, "posts": 7}
+
+
+def test_sqlite_row_estimates_without_statistics(sqlite_file):
+    conn = sqlite3.connect(sqlite_file)
+
+    assert sqlite_row_estimates(conn, ["users"]) == {"users": -1}
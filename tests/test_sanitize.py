@@ -0,0 +1,117 @@
+"""Test UTF-8 decoding and text sanitization"""
+
+import json
+import sqlite3
+from collections import Counter
+from unittest.mock import MagicMock
+
+from open_webui_sqlite_migration.migrate import (
+    normalize_row,
+    pg_column_lengths_bulk,
+    stream_sqlite_rows,
+    table_rows,
+)
+
+
+def _sqlite(values):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE note (id INTEGER, title TEXT)")
+    conn.executemany("INSERT INTO note VALUES (?, ?)", values)
+    return conn
+
+
+def test_stream_sqlite_rows_valid_text():
+    conn = _sqlite([(1, "a"), (2, "ä")])
+
+    assert list(stream_sqlite_rows(conn, "note", ["id", "title"])) == [(1, "a"), (2, "ä")]
+
+
+def test_stream_sqlite_rows_invalid_utf8_falls_back_to_bytes():
+    conn = _sqlite([(i, f"t{i}") for i in range(1200)])
+    conn.execute("UPDATE note SET title = CAST(X'61FF62' AS TEXT) WHERE id = 1100")
+
+    rows = list(stream_sqlite_rows(conn, "note", ["id", "title"]))
+
+    assert [r[0] for r in rows] == list(range(1200))
+    assert rows[0] == (0, "t0")
+    assert rows[1100] == (1100, b"a\xffb")
+    assert rows[1101] == (1101, b"t1101")
+    assert conn.text_factory is str
+
+
+def test_table_rows_repairs_invalid_utf8():
+    conn = _sqlite([(1, "ok")])
+    conn.execute("INSERT INTO note VALUES (2, CAST(X'61FF62' AS TEXT))")
+    rewrites = Counter()
+
+    rows = list(table_rows(conn, "note", ["id", "title"], {"title": "text"}, rewrites))
+
+    assert rows == [(1, "ok"), (2, "a\ufffdb")]
+    assert rewrites == {("title", "invalid utf-8"): 1}
+
+
+def test_normalize_row_keeps_bytea():
+    assert normalize_row((b"\xff",), ["data"], {"data": "bytea"}) == (b"\xff",)
+
+
+def test_normalize_row_strips_nul_from_text():
+    rewrites = Counter()
+
+    result = normalize_row(("a\x00b", "c"), ["x", "y"], {"x": "text", "y": "text"}, rewrites=rewrites)
+
+    assert result == ("ab", "c")
+    assert rewrites == {("x", "nul removed"): 1}
+
+
+def test_normalize_row_strips_nul_from_jsonb():
+    rewrites = Counter()
+    value = json.dumps({"a": "x\x00y", "b\x00": ["z\x00"]})
+
+    result = normalize_row((value, '{"a": 1}'), ["meta", "data"],
+                           {"meta": "jsonb", "data": "jsonb"}, rewrites=rewrites)
+
+    assert json.loads(result[0]) == {"a": "xy", "b": ["z"]}
+    assert result[1] == '{"a": 1}'
+    assert rewrites == {("meta", "nul removed"): 1}
+
+
+def test_normalize_row_escaped_backslash_is_not_nul():
+    rewrites = Counter()
+    value = json.dumps({"path": "C:\\u0000"})
+
+    result = normalize_row((value,), ["meta"], {"meta": "jsonb"}, rewrites=rewrites)
+
+    assert json.loads(result[0]) == {"path": "C:\\u0000"}
+    assert not rewrites
+
+
+def test_normalize_row_strips_nul_escape_only():
+    rewrites = Counter()
+    value = '{"a": 1E400, "b": "\\u0000x", "c": "\\\\\\u0000"}'
+
+    result = normalize_row((value,), ["meta"], {"meta": "jsonb"}, rewrites=rewrites)
+
+    assert result == ('{"a": 1E400, "b": "x", "c": "\\\\"}',)
+    assert rewrites == {("meta", "nul removed"): 1}
+
+
+def test_normalize_row_cuts_to_varchar_length():
+    rewrites = Counter()
+
+    result = normalize_row(("abcdef", "ab"), ["name", "code"],
+                           {"name": "character varying", "code": "character varying"},
+                           rewrites=rewrites, max_lengths={"name": 4, "code": 4})
+
+    assert result == ("abcd", "ab")
+    assert rewrites == {("name", "cut to 4 characters"): 1}
+
+
+def test_pg_column_lengths_bulk():
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [("user", "name", 255)]
+
+    lengths = pg_column_lengths_bulk(pg_conn, ["user", "chat"], "acme")
+
+    assert lengths == {"user": {"name": 255}, "chat": {}}
+    assert cursor.execute.call_args[0][1] == ("acme", ["user", "chat"])
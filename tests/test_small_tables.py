@@ -0,0 +1,107 @@
+"""Test the batched path for small tables"""
+
+import sqlite3
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+
+from open_webui_sqlite_migration.migrate import (
+    group_small_tables,
+    migrate_tables,
+    pg_column_types_bulk,
+)
+
+
+def test_pg_column_types_bulk():
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [("chat", "meta", "jsonb"), ("chat", "id", "text")]
+
+    types = pg_column_types_bulk(pg_conn, ["chat", "tag"], "acme")
+
+    assert types == {"chat": {"meta": "jsonb", "id": "text"}, "tag": {}}
+    cursor.execute.assert_called_once()
+    assert cursor.execute.call_args.args[1] == ("acme", ["chat", "tag"])
+
+
+def test_group_small_tables_keeps_order():
+    counts = {"user": 5, "tag": 3, "chat": 5000, "folder": 0, "tool": 1, "bad": -1, "x": 2}
+    tables = ["user", "tag", "chat", "folder", "tool", "bad", "x"]
+
+    assert group_small_tables(tables, counts, 100) == [
+        ["user", "tag"], ["chat"], ["folder", "tool"], ["bad"], ["x"],
+    ]
+
+
+def _sqlite():
+    conn = sqlite3.connect(":memory:")
+    for table, rows in (("tag", 2), ("folder", 1), ("chat", 50)):
+        conn.execute(f"CREATE TABLE {table} (id INTEGER)")
+        conn.executemany(f"INSERT INTO {table} VALUES (?)", [(i,) for i in range(rows)])
+    return conn
+
+
+def _pg(fail_on=None):
+    log = []
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = []
+
+    def execute(sql, params=None):
+        log.append(" ".join(sql.split()[:4]) if sql.startswith("TRUNCATE") else sql.split()[0])
+
+    def copy_expert(sql, stream):
+        while stream.read(8192):
+            pass
+        log.append(sql.split()[1])
+        if sql.split()[1] == fail_on:
+            raise psycopg2.DataError("bad")
+
+    cursor.execute.side_effect = execute
+    cursor.copy_expert.side_effect = copy_expert
+    pg_conn.commit.side_effect = lambda: log.append("COMMIT")
+    pg_conn.rollback.side_effect = lambda: log.append("ROLLBACK")
+    return pg_conn, log
+
+
+def test_migrate_tables_batches_small_tables():
+    pg_conn, log = _pg()
+    counts = {"tag": 2, "folder": 1, "chat": 50}
+
+    migrate_tables(_sqlite(), pg_conn, ["tag", "folder", "chat"], counts, small_table_rows=10)
+
+    assert log == [
+        "SELECT", "SELECT",
+        "TRUNCATE TABLE tag, folder", "tag", "folder", "COMMIT",
+        "TRUNCATE TABLE chat CASCADE", "chat", "COMMIT",
+    ]
+
+
+def test_migrate_tables_without_batching():
+    pg_conn, log = _pg()
+    counts = {"tag": 2, "folder": 1, "chat": 50}
+
+    migrate_tables(_sqlite(), pg_conn, ["tag", "folder", "chat"], counts, small_table_rows=0)
+
+    assert log.count("COMMIT") == 3
+
+
+def test_migrate_tables_group_rolls_back_on_error():
+    pg_conn, log = _pg(fail_on="folder")
+    counts = {"tag": 2, "folder": 1, "chat": 50}
+
+    with pytest.raises(psycopg2.DataError):
+        migrate_tables(_sqlite(), pg_conn, ["tag", "folder", "chat"], counts)
+
+    assert log[-2:] == ["folder", "ROLLBACK"]
+    assert "COMMIT" not in log
+
+
+def test_migrate_tables_atomic_group_leaves_commit_to_caller():
+    pg_conn, log = _pg()
+    counts = {"tag": 2, "folder": 1}
+
+    migrate_tables(_sqlite(), pg_conn, ["tag", "folder"], counts, transaction="atomic")
+
+    assert "COMMIT" not in log
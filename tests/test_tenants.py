@@ -0,0 +1,128 @@
+"""Test concurrent multi-tenant migration"""
+
+import json
+import sqlite3
+import threading
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import (
+    ConnectionBudget,
+    MigrationConfig,
+    Tenant,
+    migrate_tenants,
+    print_tenant_results,
+    read_tenants,
+)
+
+
+def _write_manifest(tmp_path, tenants):
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps({"tenants": tenants}))
+    return path
+
+
+def test_read_tenants_defaults(tmp_path):
+    path = _write_manifest(tmp_path, [
+        {"name": "acme", "sqlite_path": "/data/acme.db", "schema": "acme"},
+        {"name": "globex", "sqlite_path": "/data/globex.db",
+         "database_url": "postgresql://other"},
+    ])
+
+    tenants = read_tenants(path, "postgresql://default")
+
+    assert tenants == [
+        Tenant("acme", migrate.Path("/data/acme.db"), "postgresql://default", "acme"),
+        Tenant("globex", migrate.Path("/data/globex.db"), "postgresql://other", "public"),
+    ]
+
+
+@pytest.mark.parametrize("tenants, message", [
+    ([{"sqlite_path": "/a.db"}], "missing 'name'"),
+    ([{"name": "a", "sqlite_path": "/a.db", "schema": "a; DROP"}], "Invalid schema"),
+    ([{"name": "a", "sqlite_path": "/a.db"}, {"name": "a", "sqlite_path": "/b.db",
+                                              "schema": "b"}], "Duplicate tenant"),
+    ([{"name": "a", "sqlite_path": "/a.db"}, {"name": "b", "sqlite_path": "/b.db"}],
+     "share a database"),
+])
+def test_read_tenants_invalid(tmp_path, tenants, message):
+    with pytest.raises(RuntimeError, match=message):
+        read_tenants(_write_manifest(tmp_path, tenants), "postgresql://default")
+
+
+def test_read_tenants_without_database_url(tmp_path):
+    path = _write_manifest(tmp_path, [{"name": "a", "sqlite_path": "/a.db"}])
+    with pytest.raises(RuntimeError, match="no database_url"):
+        read_tenants(path)
+
+
+def test_connection_budget():
+    budget = ConnectionBudget(3)
+    entered = threading.Event()
+
+    def hold_two():
+        with budget.hold(2):
+            entered.set()
+
+    with budget.hold(2):
+        thread = threading.Thread(target=hold_two)
+        thread.start()
+        assert not entered.wait(0.05)
+    thread.join(1)
+    assert entered.is_set()
+
+    with budget.hold(10):
+        assert budget._free == 0  # pylint: disable=protected-access
+    assert budget._free == 3  # pylint: disable=protected-access
+
+
+def _tenant_db(tmp_path, name, rows):
+    path = tmp_path / f"{name}.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE tag (id TEXT)")
+    conn.executemany("INSERT INTO tag VALUES (?)", [(str(i),) for i in range(rows)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_migrate_tenants(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrate, "pg_column_types", lambda conn, table, schema="public": {})
+    conns = {}
+
+    def fake_connect(url):
+        conn = MagicMock()
+        conns.setdefault(url, []).append(conn)
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.copy_expert.side_effect = lambda sql, stream: stream.read(1 << 20)
+        return conn
+
+    monkeypatch.setattr(psycopg2, "connect", fake_connect)
+    tenants = [
+        Tenant("acme", _tenant_db(tmp_path, "acme", 3), "postgresql://acme", "acme"),
+        Tenant("globex", _tenant_db(tmp_path, "globex", 2), "postgresql://globex"),
+        Tenant("broken", tmp_path / "missing.db", "postgresql://broken"),
+    ]
+
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+    config = MigrationConfig(None, None, chunk_rows=2, finalize=False, order={"tag": "id"})
+
+    results = migrate_tenants(tenants, config, max_parallel=2, max_connections=1)
+
+    assert [(r.tables, r.rows, r.error is None) for r in results] == [
+        (1, 3, True), (1, 2, True), (0, 0, False),
+    ]
+    _, acme = conns["postgresql://acme"]
+    cursor = acme.cursor.return_value.__enter__.return_value
+    cursor.execute.assert_any_call("SET search_path TO acme")
+    cursor.execute.assert_any_call("SET session_replication_role = replica")
+    assert any("SQLite sorts the table first" in str(line) for line in lines)
+    assert "postgresql://broken" not in conns
+
+    lines.clear()
+    print_tenant_results(results)
+    assert len(lines) == 1
@@ -0,0 +1,263 @@
+"""Test the COPY rate throttle"""
+
+import sqlite3
+from unittest.mock import MagicMock
+
+import psycopg2
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import (
+    CommitLatencyMonitor,
+    CommitStats,
+    CopyStream,
+    LogProgressReporter,
+    MigrationConfig,
+    Migrator,
+    ReplicationLagMonitor,
+    RichProgressReporter,
+    Throttle,
+    extract_tables,
+    load_directory,
+    make_throttle,
+    pg_commit_latency,
+    pg_replication_lag,
+)
+
+
+def _throttle(**kwargs):
+    now = [0.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    throttle = Throttle(clock=lambda: now[0], sleep=sleep, **kwargs)
+    return throttle, now, slept
+
+
+def test_throttle_limits_rate():
+    throttle, now, slept = _throttle(max_rate=1_000_000)
+
+    for _ in range(3):
+        throttle.wait(500_000)
+
+    assert slept == [0.5, 0.5]
+    assert now[0] == 1.0
+    assert throttle.status() == "effective 1.5 MB/s (limit 1.0 MB/s)"
+
+
+def test_throttle_without_rate_does_not_wait():
+    throttle, _, slept = _throttle()
+
+    throttle.wait(10_000_000)
+
+    assert slept == []
+    assert throttle.status() == "effective 10.0 MB/s (no limit)"
+
+
+def test_throttle_aimd():
+    throttle, _, _ = _throttle(max_rate=8_000_000, target=1.0, min_rate=3_000_000)
+
+    throttle.observe(2.0)
+    assert throttle.rate == 4_000_000
+    throttle.observe(2.0)
+    assert throttle.rate == 3_000_000
+    throttle.observe(0.5)
+    assert throttle.rate == 4_000_000
+    for _ in range(10):
+        throttle.observe(0.0)
+    assert throttle.rate == 8_000_000
+    assert throttle.backoffs == 2
+
+
+def test_throttle_backs_off_from_effective_rate():
+    throttle, now, _ = _throttle(target=1.0)
+    throttle.wait(6_000_000)
+    now[0] = 2.0
+    throttle.wait(6_000_000)
+
+    throttle.observe(5.0)
+
+    assert throttle.rate == 3_000_000
+    now[0] = 10.0
+    assert throttle.effective_rate() == 0.0
+
+
+def test_throttle_without_target_ignores_signals():
+    throttle, _, _ = _throttle(max_rate=1_000_000)
+
+    throttle.observe(100.0)
+
+    assert throttle.rate == 1_000_000
+
+
+def test_make_throttle():
+    assert make_throttle() is None
+    assert make_throttle(20).rate == 20_000_000
+    assert make_throttle(throttle_on="replication-lag").target == 10.0
+    assert make_throttle(5, "commit-latency", 0.2).target == 0.2
+
+
+def test_copy_stream_waits_for_throttle():
+    throttle = MagicMock()
+    stream = CopyStream(iter([(1, "a"), (2, "b")]), throttle=throttle)
+
+    while stream.read(4):
+        pass
+
+    assert sum(c.args[0] for c in throttle.wait.call_args_list) == 8
+
+    throttle = MagicMock()
+    progress = []
+    stream = CopyStream(
+        iter([(1, "é"), (2, "日本")]), lambda rows, nbytes: progress.append(nbytes), throttle
+    )
+
+    while stream.read(4):
+        pass
+
+    assert sum(c.args[0] for c in throttle.wait.call_args_list) == 14
+    assert sum(progress) == 14
+
+
+def test_commit_stats_on_commit():
+    latencies = []
+    stats = CommitStats(latencies.append)
+
+    stats.commit(MagicMock())
+
+    assert len(latencies) == 1
+
+
+def test_progress_shows_throttle(monkeypatch):
+    throttle, _, _ = _throttle(max_rate=2_000_000)
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+    reporter = LogProgressReporter(10, 1, interval=0, clock=lambda: 1.0, throttle=throttle)
+
+    reporter.start_table("chat", 10)
+    reporter.advance("chat", 10, 500)
+
+    assert lines[-1].endswith(" effective 0.0 MB/s (limit 2.0 MB/s)")
+
+    reporter = RichProgressReporter(10, 1, throttle)
+    reporter.start_table("chat", 10)
+    reporter.advance("chat", 10, 500)
+    assert "(limit 2.0 MB/s)" in reporter._progress.tasks[0].description
+
+
+def test_pg_replication_lag():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = (2.5,)
+
+    assert pg_replication_lag(conn) == 2.5
+    assert "pg_stat_replication" in cursor.execute.call_args[0][0]
+
+
+def test_replication_lag_monitor(monkeypatch):
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value.fetchone.return_value = (30.0,)
+    monkeypatch.setattr(migrate.psycopg2, "connect", lambda url: conn)
+    throttle = Throttle(max_rate=8_000_000, target=10.0)
+    monitor = ReplicationLagMonitor("postgresql://pg", throttle, interval=0.001)
+
+    with monitor:
+        while not throttle.backoffs:
+            monitor._stop.wait(0.001)
+
+    assert throttle.rate < 8_000_000
+    conn.close.assert_called_once()
+
+
+def test_commit_latency_monitor(monkeypatch):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    monkeypatch.setattr(migrate.psycopg2, "connect", lambda url: conn)
+    monkeypatch.setattr(migrate, "pg_commit_latency", lambda conn: 2.0)
+    throttle = Throttle(max_rate=8_000_000, target=1.0)
+    monitor = CommitLatencyMonitor("postgresql://pg", throttle, interval=0.001)
+
+    with monitor:
+        while not throttle.backoffs:
+            monitor._stop.wait(0.001)
+
+    assert throttle.rate < 8_000_000
+    assert CommitLatencyMonitor("postgresql://pg", throttle).interval == 1.0
+
+    assert pg_commit_latency(conn) >= 0
+    cursor.execute.assert_called_with("SELECT txid_current()")
+
+
+def test_replication_lag_monitor_errors(monkeypatch):
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(msg))
+
+    def refuse(url):
+        raise psycopg2.OperationalError("refused")
+
+    monkeypatch.setattr(migrate.psycopg2, "connect", refuse)
+    with ReplicationLagMonitor("postgresql://pg", Throttle(), interval=0.001):
+        pass
+
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value.execute.side_effect = psycopg2.Error("denied")
+    monkeypatch.setattr(migrate.psycopg2, "connect", lambda url: conn)
+    monitor = ReplicationLagMonitor("postgresql://pg", Throttle(), interval=0.001)
+    with monitor:
+        monitor._thread.join()
+
+    assert lines == [
+        "[yellow]Replication lag is not monitored: refused[/]",
+        "[yellow]Replication lag is no longer monitored: denied[/]",
+    ]
+
+
+def test_load_directory_throttled(tmp_path, monkeypatch):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE tag (id TEXT)")
+    conn.executemany("INSERT INTO tag VALUES (?)", [(str(i),) for i in range(5)])
+    extract_tables(conn, tmp_path, chunk_rows=2)
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    cursor.copy_expert.side_effect = lambda sql, stream: stream.read(8192)
+    monkeypatch.setattr(psycopg2, "connect", lambda *a, **kw: pg_conn)
+    throttle = MagicMock()
+    commit_stats = CommitStats()
+
+    load_directory("postgresql://pg", tmp_path, 1, throttle=throttle, commit_stats=commit_stats)
+
+    assert sum(c.args[0] for c in throttle.wait.call_args_list) == 10
+    assert commit_stats.count == 3
+
+
+def test_migrator_run_throttled(tmp_path, monkeypatch):
+    path = tmp_path / "webui.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE chat (id INTEGER PRIMARY KEY, title TEXT)")
+    conn.executemany("INSERT INTO chat VALUES (?, 'c')", [(i,) for i in range(5)])
+    conn.commit()
+    conn.close()
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = []
+    cursor.copy_expert.side_effect = lambda sql, stream: stream.read(8192)
+    monkeypatch.setattr(migrate.psycopg2, "connect", lambda url: pg_conn)
+    lines = []
+    monkeypatch.setattr(migrate.console, "print", lambda msg, **kw: lines.append(str(msg)))
+    config = MigrationConfig(
+        path, "postgresql://pg", max_rate=100, throttle_on="commit-latency",
+        throttle_target=0.0,
+    )
+
+    result = Migrator(config).run()
+
+    assert result.commits.on_commit is not None
+    assert isinstance(Migrator(config).throttle(CommitStats())[1], CommitLatencyMonitor)
+    assert "[dim]Throttle: 1 backoffs, ended at 50.0 MB/s[/]" in lines
+
+    config.throttle_on = "replication-lag"
+    throttle, monitor = Migrator(config).throttle(CommitStats())
+    assert isinstance(monitor, ReplicationLagMonitor)
+    assert monitor.throttle is throttle
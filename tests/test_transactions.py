@@ -0,0 +1,127 @@
+"""Test transaction policies"""
+
+import sqlite3
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+
+from open_webui_sqlite_migration import migrate
+from open_webui_sqlite_migration.migrate import CommitStats, iter_chunks
+
+
+@pytest.fixture(autouse=True)
+def _no_catalog(monkeypatch):
+    monkeypatch.setattr(migrate, "pg_column_types", lambda conn, table, schema="public": {})
+
+
+def _sqlite(rows=5):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE tag (id INTEGER)")
+    conn.executemany("INSERT INTO tag VALUES (?)", [(i,) for i in range(rows)])
+    return conn
+
+
+def _pg(fail_on_copy=None):
+    """Mock Postgres connection logging statements, COPYs and commits in order."""
+    log = []
+    pg_conn = MagicMock()
+    cursor = pg_conn.cursor.return_value.__enter__.return_value
+    cursor.execute.side_effect = lambda sql: log.append(sql.split()[0])
+
+    def fake_copy_expert(sql, stream):
+        data = ""
+        while chunk := stream.read(8192):
+            data += chunk
+        log.append(f"COPY {data.count(chr(10))}")
+        if fail_on_copy is not None and len(log) >= fail_on_copy:
+            raise psycopg2.OperationalError("connection lost")
+
+    cursor.copy_expert.side_effect = fake_copy_expert
+    pg_conn.commit.side_effect = lambda: log.append("COMMIT")
+    pg_conn.rollback.side_effect = lambda: log.append("ROLLBACK")
+    return pg_conn, log
+
+
+def test_iter_chunks():
+    assert [list(c) for c in iter_chunks(range(5), 2)] == [[0, 1], [2, 3], [4]]
+
+
+def test_per_table_commits_truncate_and_copy_together():
+    pg_conn, log = _pg()
+    stats = CommitStats()
+
+    migrate.migrate_table(_sqlite(), pg_conn, "tag", commit_stats=stats)
+
+    assert log == ["TRUNCATE", "COPY 5", "COMMIT"]
+    assert stats.count == 1
+
+
+def test_atomic_leaves_commit_to_caller():
+    pg_conn, log = _pg()
+
+    migrate.migrate_table(_sqlite(), pg_conn, "tag", transaction="atomic")
+
+    assert log == ["TRUNCATE", "COPY 5"]
+
+
+def test_per_chunk_commits_every_chunk():
+    pg_conn, log = _pg()
+    stats = CommitStats()
+
+    migrate.migrate_table(
+        _sqlite(), pg_conn, "tag", transaction="per-chunk", chunk_rows=2, commit_stats=stats
+    )
+
+    assert log == [
+        "TRUNCATE", "COPY 2", "COMMIT", "COPY 2", "COMMIT", "COPY 1", "COMMIT",
+    ]
+    assert stats.count == 3
+    assert "3 commits" in stats.summary()
+
+
+def test_per_chunk_commits_truncate_of_empty_table():
+    pg_conn, log = _pg()
+
+    migrate.migrate_table(_sqlite(0), pg_conn, "tag", transaction="per-chunk")
+
+    assert log == ["TRUNCATE", "COMMIT"]
+
+
+def test_per_chunk_with_rejects_commits_every_chunk(tmp_path):
+    pg_conn, log = _pg()
+    rejects = migrate.RejectWriter(tmp_path / "rejects.jsonl")
+
+    migrate.migrate_table(
+        _sqlite(), pg_conn, "tag", transaction="per-chunk", chunk_rows=3, rejects=rejects
+    )
+
+    assert log.count("COMMIT") == 2
+    assert log.count("SAVEPOINT") == 2
+
+
+def test_per_table_rolls_back_on_error():
+    pg_conn, log = _pg(fail_on_copy=2)
+
+    with pytest.raises(psycopg2.OperationalError):
+        migrate.migrate_table(_sqlite(), pg_conn, "tag")
+
+    assert log == ["TRUNCATE", "COPY 5", "ROLLBACK"]
+
+
+def test_per_chunk_keeps_committed_chunks_on_error():
+    pg_conn, log = _pg(fail_on_copy=4)
+
+    with pytest.raises(psycopg2.OperationalError):
+        migrate.migrate_table(_sqlite(), pg_conn, "tag", transaction="per-chunk", chunk_rows=2)
+
+    assert log == ["TRUNCATE", "COPY 2", "COMMIT", "COPY 2", "ROLLBACK"]
+
+
+def test_atomic_does_not_roll_back_itself():
+    pg_conn, log = _pg(fail_on_copy=2)
+
+    with pytest.raises(psycopg2.OperationalError):
+        migrate.migrate_table(_sqlite(), pg_conn, "tag", transaction="atomic")
+
+    assert "ROLLBACK" not in log